@@ -0,0 +1,89 @@
+# Import standard libraries
+import heapq
+import operator
+import collections
+
+# Number of buckets popularity (0-100) is split into
+POPULARITY_BUCKETS = 10
+
+
+class PlaylistStats:
+    """
+    Works out statistics about a playlist in a single pass,
+    adding tracks as they are fetched
+    """
+    def __init__(self):
+        self.tracks = 0
+        self.artists = collections.Counter()
+        self.albums = set()
+        self.years = collections.Counter()
+        self.popularity = [0] * POPULARITY_BUCKETS
+        self.popularity_total = 0
+        self.popularity_count = 0
+
+    def add(self, track) -> None:
+        """
+        :arg track: The trackinfo.Track to add (Required)
+        :return None:
+        Adds a track to the statistics
+        """
+        self.tracks += 1
+        self.artists.update(track.artist_names)
+
+        if track.album is not None:
+            self.albums.add(track.album)
+        if track.year is not None:
+            self.years[track.year] += 1
+        if track.popularity is not None:
+            bucket = min(track.popularity * POPULARITY_BUCKETS // 100,
+                         POPULARITY_BUCKETS - 1)
+            self.popularity[bucket] += 1
+            self.popularity_total += track.popularity
+            self.popularity_count += 1
+
+    def add_page(self, page: list) -> None:
+        """
+        :arg page: A list of trackinfo.Track (Required)
+        :return None:
+        Adds every track on a page to the statistics
+        """
+        for track in page:
+            self.add(track)
+
+    def top_artists(self, k: int = 10) -> list:
+        """
+        :arg k: The number of artists to get (Optional)
+        :return list: The name and percentage of the top artists
+        Gets the most common artists and their share of the credits
+        """
+        total = sum(self.artists.values())
+        top = heapq.nlargest(k, self.artists.items(),
+                             key=operator.itemgetter(1))
+
+        return [(name, format(count / total * 100, '.3'))
+                for name, count in top]
+
+    def summary(self, k: int = 10) -> dict:
+        """
+        :arg k: The number of top artists to include (Optional)
+        :return dict: The statistics of the playlist
+        Gets all the statistics about the playlist
+        """
+        years = None
+        if self.years:
+            years = [min(self.years), max(self.years),
+                     self.years.most_common(1)[0][0]]
+
+        popularity = None
+        if self.popularity_count:
+            popularity = {"mean": format(self.popularity_total /
+                                         self.popularity_count, '.3'),
+                          "buckets": list(self.popularity)}
+
+        return {"artists": self.top_artists(k),
+                "Total": sum(self.artists.values()),
+                "Distinct": len(self.artists),
+                "Tracks": self.tracks,
+                "Albums": len(self.albums),
+                "Years": years,
+                "Popularity": popularity}
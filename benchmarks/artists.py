@@ -0,0 +1,99 @@
+# Import standard libraries
+import os
+import sys
+import random
+import timeit
+import collections
+
+# Let the benchmark import the bot's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import custom scripts
+import analytics
+import trackinfo
+
+# Number of tracks in each playlist
+PLAYLIST_SIZE = 50000
+
+# Numbers of distinct artists the playlists are made from
+ARTIST_COUNTS = (500, 2000, 5000)
+
+# Number of times each count is timed, the best time is shown
+REPEATS = 3
+
+
+def make_playlist(artists: int) -> list:
+    """
+    :arg artists: The number of distinct artists to use (Required)
+    :return list: Playlist items shaped like the api response
+    Creates a playlist where a few artists are much more common
+    """
+    rng = random.Random(artists)
+    weights = [1 / (rank + 1) for rank in range(artists)]
+    chosen = rng.choices(range(artists), weights, k=PLAYLIST_SIZE)
+
+    return [{"track": {"id": f"track{i}", "name": f"Track {i}",
+                       "is_local": False, "popularity": rng.randint(0, 100),
+                       "album": {"name": f"Album {artist}",
+                                 "release_date": f"{rng.randint(1960, 2021)}"},
+                       "artists": [{"id": f"artist{artist}",
+                                    "name": f"Artist {artist}"}]}}
+            for i, artist in enumerate(chosen)]
+
+
+def baseline(items: list) -> dict:
+    """
+    :arg items: The items of the playlist (Required)
+    :return dict: The top artists and the total
+    The counting spotifyauth.get_artists used originally
+    """
+    artists = []
+    for track in items:
+        artists += [artist['name'] for artist in track['track']['artists']]
+
+    artists = collections.Counter(artists)
+
+    percentages = [format(artists[key]/sum(map(int, artists.values()))*100,
+                          '.3') for key in artists.keys()]
+
+    return {"artists": sorted(list(zip(artists.keys(), percentages)),
+                              key=lambda x: 100-float(x[1]))[:10],
+            "Total": sum(map(int, artists.values()))}
+
+
+def single_pass(tracks: list) -> dict:
+    """
+    :arg tracks: The trackinfo.Track of the playlist (Required)
+    :return dict: The statistics of the playlist
+    The counting spotifyauth.get_artists uses now
+    """
+    stats = analytics.PlaylistStats()
+    stats.add_page(tracks)
+    return stats.summary(10)
+
+
+def main() -> None:
+    """
+    :return None:
+    Times the original and single pass artist counting
+    on 50k track playlists
+    """
+    print(f"{'artists':>7} {'baseline':>10} {'analytics':>10} {'speedup':>8}")
+    for artists in ARTIST_COUNTS:
+        items = make_playlist(artists)
+        tracks = [trackinfo.Track.from_item(item) for item in items]
+
+        old, new = baseline(items), single_pass(tracks)
+        assert old["Total"] == new["Total"]
+        assert ([share for _, share in old["artists"]] ==
+                [share for _, share in new["artists"]])
+
+        old = min(timeit.repeat(lambda: baseline(items),
+                                number=1, repeat=REPEATS))
+        new = min(timeit.repeat(lambda: single_pass(tracks),
+                                number=1, repeat=REPEATS))
+        print(f"{artists:>7} {old:>10.4f} {new:>10.4f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
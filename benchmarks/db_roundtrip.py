@@ -0,0 +1,104 @@
+# Import standard libraries
+import os
+import sys
+import time
+import timeit
+
+# Let the benchmark import the bot's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import 3rd party libraries
+import psycopg2
+
+# Import custom scripts
+import computations
+import database
+
+URL = os.getenv('DATABASE_URL')
+
+# User the benchmark creates and removes again
+USER = "benchmark-roundtrip"
+SCOPE = "user-library-read playlist-read-private"
+
+# Number of commands timed, the mean time of one is shown
+COMMANDS = 50
+
+# Number of times each set of commands is timed, the best time is used
+REPEATS = 3
+
+
+def baseline_query(statement: str, args: tuple, fetch: bool = True,
+                   commit: bool = False):
+    """
+    :arg statement: The sql statement to run (Required)
+    :arg args: The arguments for the statement (Required)
+    :arg fetch: Whether to fetch a row (Optional)
+    :arg commit: Whether to commit the statement (Optional)
+    :return: The fetched row, if any
+    Runs a statement on a new connection like the original helpers did
+    """
+    con = psycopg2.connect(URL)
+    cur = con.cursor()
+    cur.execute(statement, args)
+    row = cur.fetchone() if fetch else None
+    cur.close()
+    if commit:
+        con.commit()
+    con.close()
+    return row
+
+
+def baseline_command() -> None:
+    """
+    :return None:
+    The helpers one command ran originally, each opening a connection
+    """
+    baseline_query("SELECT scope FROM AuthData\nWHERE personid = %s;",
+                   (USER,))
+    baseline_query("SELECT personid FROM AuthData\nWHERE personid = %s;",
+                   (USER,))
+    baseline_query("SELECT * FROM AuthData\nWHERE personid = %s;", (USER,))
+    baseline_query("UPDATE AuthData\n"
+                   "SET authtoken = %s, refreshtoken = %s,"
+                   "time = %s, scope = %s\n"
+                   "WHERE personid = %s;",
+                   ("token", "refresh", time.time(), SCOPE, USER),
+                   fetch=False, commit=True)
+
+
+def pooled_command() -> None:
+    """
+    :return None:
+    The same helpers using the connection pool and user cache
+    """
+    computations.check_user(USER, SCOPE)
+    computations.check_user_exist(USER)
+    computations.get_user(USER)
+    computations.update_user(USER, "token", "refresh", time.time(), SCOPE)
+
+
+def main() -> None:
+    """
+    :return None:
+    Times the database work of one command before and after pooling
+    """
+    computations.save_user(USER, "token", "refresh", time.time(), SCOPE)
+    try:
+        # Open the pool first so its start up isn't counted
+        pooled_command()
+
+        old = min(timeit.repeat(baseline_command, number=COMMANDS,
+                                repeat=REPEATS)) / COMMANDS
+        new = min(timeit.repeat(pooled_command, number=COMMANDS,
+                                repeat=REPEATS)) / COMMANDS
+    finally:
+        computations.delete_user(USER)
+
+    print(f"{'connect per call':>16} {old * 1000:>9.2f} ms per command")
+    print(f"{'pool and cache':>16} {new * 1000:>9.2f} ms per command")
+    print(f"{'speedup':>16} {old / new:>9.1f}x")
+    print(f"pool: {database.pool_stats()}")
+
+
+if __name__ == "__main__":
+    main()
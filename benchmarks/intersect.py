@@ -0,0 +1,76 @@
+# Import standard libraries
+import os
+import sys
+import random
+import timeit
+
+# Let the benchmark import the bot's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import custom script
+import overlap
+
+# Numbers of tracks in each library and the share every library has
+LIBRARY_SIZES = (1000, 10000, 100000)
+SHARED = 0.1
+
+# Numbers of users whose libraries are intersected
+USER_COUNTS = (2, 5, 10, 20)
+
+# Number of times each intersection is timed, the best time is shown
+REPEATS = 5
+
+
+def make_libraries(users: int, size: int) -> list:
+    """
+    :arg users: The number of libraries to create (Required)
+    :arg size: The number of tracks in each library (Required)
+    :return list: Libraries shaped like get_user_songs results
+    Creates libraries of random ids sharing some of their tracks
+    """
+    common = [f"common{i:018d}" for i in range(int(size * SHARED))]
+    libraries = []
+    for user in range(users):
+        own = [f"user{user:02d}{random.getrandbits(64):016x}"
+               for _ in range(size - len(common))]
+
+        # The names aren't used, so every track shares one
+        libraries.append(dict.fromkeys(common + own, ["name", "artist"]))
+    return libraries
+
+
+def baseline(song_list: list) -> set:
+    """
+    :arg song_list: The libraries to intersect (Required)
+    :return set: The shared ids
+    The intersection computations.intersection used originally
+    """
+    songs = set(song_list[0].keys())
+    for i in range(1, len(song_list)):
+        songs = set(song_list[i].keys()) & songs
+    return songs
+
+
+def main() -> None:
+    """
+    :return None:
+    Times the original and current intersections for 2-20 users
+    with libraries of 1k-100k tracks
+    """
+    print(f"{'tracks':>6} {'users':>5} {'baseline':>10} {'intersect':>10}"
+          f" {'speedup':>8}")
+    for size in LIBRARY_SIZES:
+        for users in USER_COUNTS:
+            libraries = make_libraries(users, size)
+            assert baseline(libraries) == set(overlap.intersect(libraries))
+
+            old = min(timeit.repeat(lambda: baseline(libraries),
+                                    number=1, repeat=REPEATS))
+            new = min(timeit.repeat(lambda: overlap.intersect(libraries),
+                                    number=1, repeat=REPEATS))
+            print(f"{size:>6} {users:>5} {old:>10.4f} {new:>10.4f}"
+                  f" {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Import standard libraries
+import os
+import sys
+import timeit
+import tracemalloc
+
+# Let the benchmark import the bot's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import 3rd party libraries, beautifulsoup4 is only
+# needed here as the bot no longer uses it
+import bs4
+from bs4 import BeautifulSoup
+
+# Import custom script
+import genius
+
+# Saved song pages in the old and new genius layouts,
+# with placeholder text instead of real lyrics
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+LAYOUTS = ("old_layout.html", "new_layout.html")
+
+# Number of parses timed for each page, the best time is shown
+NUMBER = 20
+REPEATS = 5
+
+
+def get_text(children: list) -> list:
+    """
+    :arg children: The children of the div to find the text of (Required)
+    :return list: A list of strings
+    Gets all text from a child element, as genius.get_text did
+    """
+    text = []
+    for child in children:
+        if isinstance(child, bs4.NavigableString):
+            text.append(child)
+        elif isinstance(child, bs4.Tag):
+            text += get_text(child.children)
+
+    return text
+
+
+def baseline(content: bytes) -> list:
+    """
+    :arg content: The html of a song's page (Required)
+    :return list: The lines of the song
+    The BeautifulSoup parsing genius.get_lyrics used originally
+    """
+    soup = BeautifulSoup(content, features='lxml')
+
+    lyrics_div = soup.find_all("div", {"class": "lyrics"})
+    if len(lyrics_div) > 0:
+        lyrics = lyrics_div[0].find("p")
+        return lyrics.text.split("\n")
+
+    lines = []
+    divs = soup.find_all("div",
+                         {"class": "Lyrics__Container-sc-1ynbvzw-6 krDVEH"})
+    for div in divs:
+        tag_text = []
+        for child in div.children:
+            tag_text += get_text([child])
+        lines += list(filter(lambda x: x != '', tag_text))
+
+    for i in range(len(lines)):
+        if lines[i][0] == "[":
+            lines[i] = "\n"+lines[i]
+    return lines
+
+
+def peak_memory(parse, content: bytes) -> int:
+    """
+    :arg parse: The function parsing the page (Required)
+    :arg content: The html of the page (Required)
+    :return int: The most bytes allocated while parsing
+    Measures the peak memory python allocates parsing a page,
+    lxml builds its tree outside of python so it isn't counted
+    """
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    """
+    :return None:
+    Times and measures parsing each saved page with
+    BeautifulSoup and with genius.parse_lyrics
+    """
+    print(f"{'page':>16} {'baseline':>10} {'lxml':>10} {'speedup':>8}"
+          f" {'baseline kB':>12} {'lxml kB':>8}")
+    for layout in LAYOUTS:
+        with open(os.path.join(PAGES, layout), "rb") as page:
+            content = page.read()
+
+        # Both find the same lines, ignoring the line break handling
+        assert ([line.strip() for line in baseline(content) if line.strip()]
+                == [line.strip() for line in genius.parse_lyrics(content)
+                    if line.strip()])
+
+        old = min(timeit.repeat(lambda: baseline(content),
+                                number=NUMBER, repeat=REPEATS)) / NUMBER
+        new = min(timeit.repeat(lambda: genius.parse_lyrics(content),
+                                number=NUMBER, repeat=REPEATS)) / NUMBER
+        old_peak = peak_memory(baseline, content) / 1024
+        new_peak = peak_memory(genius.parse_lyrics, content) / 1024
+
+        print(f"{layout:>16} {old * 1000:>8.2f}ms {new * 1000:>8.2f}ms"
+              f" {old / new:>7.1f}x {old_peak:>12.0f} {new_peak:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Import standard libraries
+import os
+import sys
+import time
+import asyncio
+
+# Let the benchmark import the bot's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import 3rd party libraries
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# Import custom scripts
+import spotifyclient
+import spotifyauth
+import computations
+
+# Number of tracks in each playlist, two pages each
+PLAYLIST_SIZE = 150
+
+# Seconds the fake server takes to answer each request
+LATENCY = float(os.getenv('BENCHMARK_LATENCY', '0.02'))
+
+# Numbers of playlists the library is synced with
+PLAYLIST_COUNTS = (10, 50, 200)
+
+
+def make_app(playlists: int) -> web.Application:
+    """
+    :arg playlists: The number of playlists the user has (Required)
+    :return Application: A fake spotify api
+    Creates a server answering the playlist endpoints sync_library uses
+    """
+    async def get_playlists(request):
+        await asyncio.sleep(LATENCY)
+        limit = int(request.query.get("limit", 20))
+        offset = int(request.query.get("offset", 0))
+        items = [{"id": f"playlist{i}", "snapshot_id": "snapshot"}
+                 for i in range(offset, min(offset + limit, playlists))]
+        return web.json_response({"total": playlists, "items": items})
+
+    async def get_tracks(request):
+        await asyncio.sleep(LATENCY)
+        playlist_id = request.match_info["playlist_id"]
+        limit = int(request.query.get("limit", 100))
+        offset = int(request.query.get("offset", 0))
+        items = [{"track": {"id": f"{playlist_id}track{i}",
+                            "name": f"Track {i}", "is_local": False,
+                            "artists": [{"id": "artist", "name": "Artist"}]}}
+                 for i in range(offset, min(offset + limit, PLAYLIST_SIZE))]
+        return web.json_response({"total": PLAYLIST_SIZE, "items": items})
+
+    app = web.Application()
+    app.router.add_get("/v1/me/playlists", get_playlists)
+    app.router.add_get("/v1/playlists/{playlist_id}/tracks", get_tracks)
+    return app
+
+
+def skip_database() -> None:
+    """
+    :return None:
+    Replaces the database and auth helpers sync_library uses,
+    so only the requests to the fake server are timed
+    """
+    async def no_scope_needed(user, scope):
+        return False
+
+    async def get_code(user, scope=None):
+        return "token"
+
+    computations.check_user_async = no_scope_needed
+    computations.get_playlist_snapshots = lambda user: {}
+    computations.save_playlist = lambda *args: None
+    computations.remove_playlists = lambda *args: None
+    computations.check_indexed = lambda user: True
+    computations.index_library = lambda user: None
+    spotifyauth.get_code = get_code
+
+
+async def baseline(sp: spotifyclient.SpotifyClient) -> dict:
+    """
+    :arg sp: The client to make requests with (Required)
+    :return dict: The songs of every playlist
+    Fetches the library one request at a time like get_user_songs did
+    """
+    playlists = []
+    offset = 0
+    while True:
+        page = await sp.get_users_playlists(50, offset)
+        playlists += page['items']
+        offset += 50
+        if offset >= page['total']:
+            break
+
+    songs = {}
+    for playlist in playlists:
+        offset = 0
+        while True:
+            page = await sp.get_tracks_playlist(playlist['id'], 100, offset)
+            for item in page['items']:
+                songs[item['track']['id']] = [item['track']['name'],
+                                              item['track']['artists'][0]
+                                              ['name']]
+            offset += 100
+            if offset >= page['total']:
+                break
+    return songs
+
+
+async def time_sync(playlists: int) -> list[float, float]:
+    """
+    :arg playlists: The number of playlists the user has (Required)
+    :return list: Seconds taken by the baseline and by sync_library
+    Serves a library of playlists and times fetching all of it
+    """
+    server = TestServer(make_app(playlists))
+    await server.start_server()
+    spotifyclient.base = str(server.make_url("/v1"))
+    try:
+        start = time.perf_counter()
+        await baseline(spotifyclient.SpotifyClient("token"))
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = await spotifyauth.sync_library("benchmark")
+        new = time.perf_counter() - start
+        assert result['Error'] == 0, result
+    finally:
+        await spotifyclient.close()
+        await server.close()
+    return [old, new]
+
+
+async def main() -> None:
+    """
+    :return None:
+    Times syncing libraries of 10-200 playlists before and after
+    """
+    skip_database()
+
+    # Don't let the rate limit hide the difference
+    spotifyclient.governor = spotifyclient.RateGovernor(10000, 10000)
+
+    print(f"{'playlists':>9} {'baseline':>10} {'sync':>10} {'speedup':>8}")
+    for playlists in PLAYLIST_COUNTS:
+        old, new = await time_sync(playlists)
+        print(f"{playlists:>9} {old:>10.3f} {new:>10.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+# Import standard libraries
+import os
+import gc
+import sys
+import json
+import random
+import tracemalloc
+
+# Let the benchmark import the bot's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import custom script
+import trackinfo
+
+# Number of tracks in the library
+LIBRARY_SIZE = 10000
+
+# Markets a track is usually available in, as spotify lists them
+MARKETS = [f"{chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(180)]
+
+
+def random_id(rng: random.Random) -> str:
+    """
+    :arg rng: The random generator to use (Required)
+    :return str: A 22 character id like spotify's
+    Creates a random base62 id
+    """
+    letters = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return "".join(rng.choice(letters) for _ in range(22))
+
+
+def make_item(rng: random.Random) -> dict:
+    """
+    :arg rng: The random generator to use (Required)
+    :return dict: A playlist item shaped like the full api response
+    Creates a playlist item with every field spotify returns
+    """
+    def link(kind, id_):
+        return {"external_urls": {"spotify": f"https://open.spotify.com/"
+                                             f"{kind}/{id_}"},
+                "href": f"https://api.spotify.com/v1/{kind}s/{id_}",
+                "id": id_, "type": kind, "uri": f"spotify:{kind}:{id_}"}
+
+    artists = [dict(link("artist", random_id(rng)), name=f"Artist {i}")
+               for i in range(rng.randint(1, 3))]
+    album_id = random_id(rng)
+    track_id = random_id(rng)
+
+    album = dict(link("album", album_id), album_type="album",
+                 artists=artists, available_markets=MARKETS,
+                 images=[{"height": size, "width": size,
+                          "url": f"https://i.scdn.co/image/{album_id}{size}"}
+                         for size in (640, 300, 64)],
+                 name=f"Album {album_id[:6]}", release_date="2019-05-17",
+                 release_date_precision="day", total_tracks=12)
+
+    track = dict(link("track", track_id), album=album, artists=artists,
+                 available_markets=MARKETS, disc_number=1,
+                 duration_ms=rng.randint(120000, 300000), episode=False,
+                 explicit=False, external_ids={"isrc": "GBUM71900000"},
+                 is_local=False, name=f"Track {track_id[:6]}",
+                 popularity=rng.randint(0, 100),
+                 preview_url=f"https://p.scdn.co/mp3-preview/{track_id}",
+                 track=True, track_number=rng.randint(1, 12))
+
+    return {"added_at": "2021-03-01T12:00:00Z",
+            "added_by": link("user", "someone"), "is_local": False,
+            "primary_color": None, "track": track,
+            "video_thumbnail": {"url": None}}
+
+
+def project(item: dict) -> dict:
+    """
+    :arg item: A full playlist item (Required)
+    :return dict: The item with only the fields in trackinfo.FIELDS
+    Cuts an item down to what spotify returns for the requested fields
+    """
+    track = item["track"]
+    return {"track": {"id": track["id"], "name": track["name"],
+                      "is_local": track["is_local"],
+                      "artists": [{"id": artist["id"], "name": artist["name"]}
+                                  for artist in track["artists"]]}}
+
+
+def measure(build) -> int:
+    """
+    :arg build: Function creating the data to measure (Required)
+    :return int: The bytes the data keeps allocated
+    Measures the memory held by the result of a function
+    """
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del data
+    return size
+
+
+def main() -> None:
+    """
+    :return None:
+    Measures the bytes per track of a library kept as the full
+    json against one kept as trackinfo.Track
+    """
+    rng = random.Random(1)
+    items = [make_item(rng) for _ in range(LIBRARY_SIZE)]
+
+    # Decode the pages inside the measurement so nothing is shared
+    full_page = json.dumps({"items": items})
+    projected_page = json.dumps({"items": [project(item) for item in items]})
+
+    full = measure(lambda: json.loads(full_page)["items"])
+    compact = measure(lambda: [trackinfo.Track.from_item(item) for item in
+                               json.loads(projected_page)["items"]])
+
+    print(f"{'tracks':>12} {LIBRARY_SIZE:>10}")
+    print(f"{'full json':>12} {full / LIBRARY_SIZE:>10.0f} bytes per track")
+    print(f"{'Track':>12} {compact / LIBRARY_SIZE:>10.0f} bytes per track")
+    print(f"{'saving':>12} {full / compact:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,13 @@ from discord.ext import commands
 import spotifyauth
 import computations
 import genius
+import lyricscache
+import database
+import outbox
+import paginator
+import scheduler
+import spotifyclient
+import retrypolicy
 
 # Load the env file containing the discord bot token
 TOKEN = os.getenv('DISCORD_TOKEN')
@@ -25,6 +32,9 @@ intents = discord.Intents.all()
 # Initialise the bot with the '+' prefix and all intents
 bot = commands.Bot(command_prefix='+', intents=intents)
 
+# Tasks running in the background, kept so they aren't garbage collected
+background_tasks = set()
+
 # Create the message to send to the user
 auth_message = '''```I'm going to send you a link
 Open the link and sign into your Spotify account
@@ -32,17 +42,24 @@ Then accept the bot access
 After redirect to the localhost site copy the new url and paste here```'''
 
 
-# Update playlists every week
+async def update_top_playlists() -> None:
+    """
+    :return None:
+    Updates the top 99 playlist of every opted in user,
+    spread out so spotify isn't sent every request at once
+    """
+    users = await computations.get_users_opt_async()
+    results = await scheduler.spread(users, spotifyauth.top_playlist)
+
+    for user, result in zip(users, results):
+        print(user, result)
+
+
+# Update playlists every week, on_ready runs again after
+# reconnecting but the scheduler only starts the loop once
 @bot.event
 async def on_ready():
-    while 1:
-        time_to_sleep = computations.find_time(datetime.datetime.now())
-        print(time_to_sleep)
-        await asyncio.sleep(time_to_sleep)
-
-        users = computations.get_users_opt()
-        for user in users:
-            print(spotifyauth.top_playlist(user))
+    scheduler.start("top99", update_top_playlists)
 
 
 # Function for dealing with reactions
@@ -89,18 +106,55 @@ async def auth_scope(ctx: discord.ext.commands.Context,
         return False
 
 
-async def send_as_message(place, info_list, pattern):
+async def send_as_message(place, info_list, pattern, header=None,
+                          filename="results"):
     """
     :arg place: ctx or ctx.author, so dm or where the original message was
     :arg info_list: The list of information
     :arg pattern: The pattern of how the message is formed
-    Sends the info as a message
+    :arg header: A message to send before the info
+    :arg filename: The name of the file if the info is sent as one
+    Sends the info as a message, or as a csv file if it is long
     """
     entries = [pattern.format(*items) for items in info_list]
-    messages = computations.form_message(entries)
 
-    for message in messages:
-        await place.send(message)
+    await outbox.send_lines(place, entries, header=header,
+                            rows=info_list, filename=filename)
+
+
+async def prefetch_lyrics(user: str) -> None:
+    """
+    :arg user: The id of the user to prefetch for (Required)
+    :return None:
+    Gets the lyrics of the songs in the user's queue so they are cached
+    """
+    songs = await spotifyauth.queued_songs(user, genius.PREFETCH_AMOUNT)
+
+    if songs['Error'] == 0:
+        await genius.prefetch(songs['info'])
+
+
+def stats_lines() -> list:
+    """
+    :return list: A line for each counter the bot keeps
+    Gets the state of the database pool, the spotify rate
+    governor, the request retries and the lyrics cache
+    """
+    sections = {"pool": database.pool_stats(),
+                "spotify": spotifyclient.governor.stats(),
+                "lyrics": lyricscache.stats()}
+
+    # Retries are counted for each endpoint, show the totals
+    sections["retries"] = {name: sum(counter.values())
+                           for name, counter in retrypolicy.metrics.items()}
+
+    lines = []
+    for section, stats in sections.items():
+        for name, value in stats.items():
+            if isinstance(value, float):
+                value = round(value, 3)
+            lines.append(f"{section}.{name}: {value}")
+    return lines
 
 
 # AccountCommands class, holds commands dealing with spotify accounts
@@ -161,7 +215,7 @@ class AccountCommands(commands.Cog):
 
         # If the user is new, set the user up,
         # else show they have already set up
-        if computations.check_user(ctx.author.id, scope):
+        if await computations.check_user_async(ctx.author.id, scope):
             # Send the user the message to explain what to do
             await ctx.author.send(auth_message)
 
@@ -189,8 +243,9 @@ class AccountCommands(commands.Cog):
             time_left = time.time()
 
             # Save details to database
-            computations.save_user(ctx.author.id, access_token,
-                                   refresh_token, time_left, scope)
+            await computations.save_user_async(ctx.author.id, access_token,
+                                               refresh_token, time_left,
+                                               scope)
 
             # Tell the user the authorisation process is complete
             await ctx.author.send("Successfully set up spotify"
@@ -206,8 +261,8 @@ class AccountCommands(commands.Cog):
         Removes any stored information about you
         """
         # If the user exists in the system, remove them
-        if computations.check_user_exist(ctx.author.id):
-            computations.delete_user(ctx.author.id)
+        if await computations.check_user_exist_async(ctx.author.id):
+            await computations.delete_user_async(ctx.author.id)
 
         # Show the user the information was deleted
         await ctx.send("Cleared Information")
@@ -222,18 +277,49 @@ class SpotifyAPI(commands.Cog):
                             *users: typing.Union[discord.Member, str]):
         """
         Compares the music taste of the specified users
+        :arg output: Where to output:
+                    'chat' -  sends the songs in chat
+                    'queue' - Adds the songs to the user's spotify queue
+                    'playlist' - Creates or adds to an
+                                    existing playlist holding the songs
+                    'estimate' - Instantly estimates the overlap from
+                                    stored libraries, comparing exactly
+                                    if a library isn't stored
         :arg users: The users to compare the music tastes of.
                     To compare @ the user or use their discord id (Required)
         """
-        if output not in ["chat", "queue", "playlist"]:
+        if output not in ["chat", "queue", "playlist", "estimate"]:
             await ctx.send(f"{output} not a valid output type,"
-                           " try chat, queue or playlist")
+                           " try chat, queue, playlist or estimate")
             return -1
         # Get the overlap of the users songs
         user_ids = [x if isinstance(x, str) else [x.id, x.name] for x in users]
 
-        # TODO improve speeds of this request
-        info = await computations.show_overlap(*user_ids)
+        # Try to estimate the overlap without fetching any libraries
+        if output == "estimate":
+            estimate = await computations.estimate_overlap(*user_ids)
+            if estimate['info'] is not None:
+                # Show how far off the estimate could be
+                margin = ""
+                if estimate['info']['margin'] > 0:
+                    margin = f" (give or take {estimate['info']['margin']})"
+                await ctx.send("You have roughly a"
+                               f" {estimate['info']['percentage']}% overlap,"
+                               f" or about {estimate['info']['total']} songs"
+                               f"{margin}")
+                return
+
+        # Show how far through fetching the libraries the bot is
+        progress_message = await ctx.send("Fetching libraries"
+                                          f" 0/{len(user_ids)}")
+
+        async def show_progress(done, total, tracks):
+            await outbox.edit(progress_message, f"Fetching libraries"
+                                                f" {done}/{total},"
+                                                f" {tracks} tracks fetched")
+
+        info = await computations.show_overlap(*user_ids,
+                                               progress=show_progress)
 
         # If an error occurred, send the error to the user
         if not info['Error'] == 0:
@@ -247,17 +333,21 @@ class SpotifyAPI(commands.Cog):
         track_info = [track for track, _ in info['info']['songs']]
 
         # Send the songs by the method specified by the user
-        if output.lower() == "chat":
+        if output.lower() in ["chat", "estimate"]:
             # Show the user the overlap and songs
-            await ctx.send(f"You have a {overlap_percentage}%"
-                           f" overlap, or {overlap} songs")
+            header = (f"You have a {overlap_percentage}%"
+                      f" overlap, or {overlap} songs")
 
-            await send_as_message(ctx, track_info, "{} by {}")
+            if output.lower() == "chat":
+                await paginator.paginate(ctx, track_info, "{} by {}",
+                                         title=header)
+            else:
+                await outbox.send(ctx, header)
 
         elif output.lower() == "queue":
             # add tracks to queue
             tracks = [track[1] for track in info['info']['songs']]
-            result = spotifyauth.add_to_queue(str(ctx.author.id), tracks)
+            result = await spotifyauth.add_to_queue(str(ctx.author.id), tracks)
 
             # If an error occurred adding to queue, send the error
             if result['Error'] != 0:
@@ -270,8 +360,9 @@ class SpotifyAPI(commands.Cog):
         elif output.lower() == "playlist":
             # Create/add to a playlist with recommended tracks
             tracks = [track[1] for track in info['info']['songs']]
-            result = spotifyauth.create_playlist(str(ctx.author.id),
-                                                 tracks, 'userOverlapPlaylist')
+            result = await spotifyauth.create_playlist(str(ctx.author.id),
+                                                       tracks,
+                                                       'userOverlapPlaylist')
 
             # If an error occurred creating a playlist, send the error
             if result['Error'] != 0:
@@ -281,8 +372,66 @@ class SpotifyAPI(commands.Cog):
             # Show the message showing the successful adding
             await ctx.send(result['info'])
 
+    @commands.command(name='similarity')
+    async def similarity(self, ctx):
+        """
+        Ranks every pair of opted in members of the server
+        by how similar their music taste is
+        """
+        if ctx.guild is None:
+            await ctx.send("This command can only be used in a server")
+            return -1
+
+        # Get the members who have opted in
+        opted = set(await computations.get_users_opt_async())
+        users = [[member.id, member.name] for member in ctx.guild.members
+                 if str(member.id) in opted]
+
+        info = await computations.guild_similarity(users)
+
+        # If an error occurred, send the error to the user
+        if info['Error'] != 0:
+            await ctx.send(info['Error'])
+            return -1
+
+        # Show the closest tastes first
+        await send_as_message(ctx, info['info']['pairs'],
+                              "{} and {}: {}% similar, {} shared songs",
+                              filename="similarity")
+
+        if info['info']['missing']:
+            await ctx.send("No stored library for "
+                           f"{', '.join(info['info']['missing'])}")
+
+    @commands.command(name='whohas')
+    async def who_has(self, ctx, link: str):
+        """
+        Shows who else has a song in their playlists
+        :arg link: A song link, id or uri
+        """
+        if ctx.guild is None:
+            await ctx.send("This command can only be used in a server")
+            return -1
+
+        song_id = computations.uri_to_id(computations.link_to_uri(link))
+        owners = await database.run(computations.get_owners, song_id)
+
+        # Only show members of this server
+        members = {str(member.id): member.name
+                   for member in ctx.guild.members}
+        names = [members[owner] for owner in owners if owner in members]
+
+        if not names:
+            await ctx.send("Nobody in this server has that song"
+                           " in a stored library")
+            return -1
+
+        await send_as_message(ctx, [[name] for name in names], "{}",
+                              header=f"{len(names)} people have that song:")
+
     @commands.command(name='comparePlay')
-    async def compare_play(self, ctx, accuracy, output, *playlists):
+    async def compare_play(self, ctx, accuracy, output,
+                           cutoff: typing.Optional[int] = None, *playlists):
         """
         Compares the contents of two playlists
         :arg accuracy: The accuracy of match
@@ -291,6 +440,8 @@ class SpotifyAPI(commands.Cog):
                     'queue' - Adds the songs to the user's spotify queue
                     'playlist' - Creates or adds to an
                                     existing playlist holding the songs
+        :arg cutoff: For rough matches, the number of playlists a song
+                     has to be in, defaults to half of them
         :arg playlists: The links for the playlists
         """
         if accuracy not in ['exact', 'rough']:
@@ -298,6 +449,13 @@ class SpotifyAPI(commands.Cog):
                            " valid try 'exact' or 'rough'")
             return -1
 
+        if cutoff is not None and (accuracy != "rough" or
+                                   not 1 <= cutoff <= len(playlists)):
+            await ctx.send("The number of playlists a song has to be in"
+                           " only works with rough and has to be between"
+                           f" 1 and {len(playlists)}")
+            return -1
+
         if output not in ["chat", "queue", "playlist"]:
             await ctx.send(f"{output} not a valid output type,"
                            " try chat, queue or playlist")
@@ -307,7 +465,8 @@ class SpotifyAPI(commands.Cog):
                      for playlist in playlists]
 
         info = await computations.playlist_overlap(str(ctx.author.id),
-                                                   accuracy, *playlists)
+                                                   accuracy, *playlists,
+                                                   cutoff=cutoff)
 
         if info['Error'] != 0:
             await ctx.send(info['Error'])
@@ -321,16 +480,19 @@ class SpotifyAPI(commands.Cog):
 
         # Send the songs by the method specified by the user
         if output.lower() == "chat":
+            title = f"{len(track_info)} songs in common"
             if accuracy == "rough":
-                await send_as_message(ctx, track_info,
-                                      "{} by {} with {} matches")
+                await paginator.paginate(ctx, track_info,
+                                         "{} by {} with {} matches",
+                                         title=title)
             else:
-                await send_as_message(ctx, track_info, "{} by {}")
+                await paginator.paginate(ctx, track_info, "{} by {}",
+                                         title=title)
 
         elif output.lower() == "queue":
             # add tracks to queue
             tracks = [track[2] for track in info['info']['songs']]
-            result = spotifyauth.add_to_queue(str(ctx.author.id), tracks)
+            result = await spotifyauth.add_to_queue(str(ctx.author.id), tracks)
 
             # If an error occurred adding to queue, send the error
             if result['Error'] != 0:
@@ -343,8 +505,9 @@ class SpotifyAPI(commands.Cog):
         elif output.lower() == "playlist":
             # Create/add to a playlist with recommended tracks
             tracks = [track[2] for track in info['info']['songs']]
-            result = spotifyauth.create_playlist(str(ctx.author.id), tracks,
-                                                 'playlistOverlapSongs')
+            result = await spotifyauth.create_playlist(str(ctx.author.id),
+                                                       tracks,
+                                                       'playlistOverlapSongs')
 
             # If an error occurred creating a playlist, send the error
             if result['Error'] != 0:
@@ -417,8 +580,8 @@ class SpotifyAPI(commands.Cog):
         source = [computations.link_to_uri(link) for link in source]
 
         # Gets recommendations based upon the specified links
-        recs = spotifyauth.get_recommendations(str(ctx.author.id),
-                                               number, source)
+        recs = await spotifyauth.get_recommendations(str(ctx.author.id),
+                                                     number, source)
 
         # If an error occurred show the error
         if recs['Error'] != 0:
@@ -431,18 +594,14 @@ class SpotifyAPI(commands.Cog):
 
         # Send the songs by the method specified by the user
         if output.lower() == "dm":
-            # Form inline code message to show song names and artists
-            entries = [f"{name} by {artist}" for name, artist in track_info]
-            messages = computations.form_message(entries)
-
-            # Send each specified message
-            for message in messages:
-                await ctx.author.send(message)
+            # Send the song names and artists in the user's dms
+            await send_as_message(ctx.author, track_info, "{} by {}",
+                                  filename="recommendations")
 
         elif output.lower() == "queue":
             # add tracks to queue
-            result = spotifyauth.add_to_queue(str(ctx.author.id),
-                                              recs['info']['tracks'])
+            result = await spotifyauth.add_to_queue(str(ctx.author.id),
+                                                    recs['info']['tracks'])
 
             # If an error occurred adding to queue, send the error
             if result['Error'] != 0:
@@ -454,9 +613,9 @@ class SpotifyAPI(commands.Cog):
 
         elif output.lower() == "playlist":
             # Create/add to a playlist with recommended tracks
-            result = spotifyauth.create_playlist(str(ctx.author.id),
-                                                 recs['info']['tracks'],
-                                                 'discordRecs')
+            result = await spotifyauth.create_playlist(str(ctx.author.id),
+                                                       recs['info']['tracks'],
+                                                       'discordRecs')
 
             # If an error occurred creating a playlist, send the error
             if result['Error'] != 0:
@@ -487,14 +646,22 @@ class SpotifyAPI(commands.Cog):
                         for i, artist_info in
                         enumerate(artists['info']['artists'])]
 
-        # Form inline code message to show artist names and percentages
-        messages = computations.form_message(artists_info +
-                                             ["Total artists:"
-                                              f" {artists['info']['Total']}"])
-
-        # Send each message
-        for message in messages:
-            await ctx.send(message)
+        # Add the other statistics about the playlist
+        info = artists['info']
+        artists_info += [f"Total artists: {info['Total']}",
+                         f"Distinct artists: {info['Distinct']}",
+                         f"Tracks: {info['Tracks']}",
+                         f"Albums: {info['Albums']}"]
+        if info['Years'] is not None:
+            artists_info.append(f"Years: {info['Years'][0]}-"
+                                f"{info['Years'][1]},"
+                                f" mostly {info['Years'][2]}")
+        if info['Popularity'] is not None:
+            artists_info.append("Average popularity:"
+                                f" {info['Popularity']['mean']}")
+
+        # Send inline code messages showing artist names and percentages
+        await outbox.send_lines(ctx, artists_info)
 
     @commands.command(name='top10')
     async def top10(self, ctx, time_range: str):
@@ -514,7 +681,7 @@ class SpotifyAPI(commands.Cog):
             return -1
 
         # Get the top ten songs for the specified range
-        songs = spotifyauth.top_ten(str(ctx.author.id), time_range)
+        songs = await spotifyauth.top_ten(str(ctx.author.id), time_range)
 
         # If an error occurred send a message
         if songs['Error'] != 0:
@@ -526,14 +693,9 @@ class SpotifyAPI(commands.Cog):
         song_details = [[i, track['name'], track['artists'][0]['name']]
                         for i, track in enumerate(songs)]
 
-        # Form inline code message to show song names and artists
-        messages = computations.form_message([f"{i+1}. {name} by {artist}"
-                                              for i, name, artist
-                                              in song_details])
-
-        # Send each message
-        for message in messages:
-            await ctx.send(message)
+        # Send inline code messages showing song names and artists
+        await outbox.send_lines(ctx, [f"{i+1}. {name} by {artist}"
+                                      for i, name, artist in song_details])
 
     @commands.command(name='topGenre')
     async def recent(self, ctx, time_range: str):
@@ -553,7 +715,7 @@ class SpotifyAPI(commands.Cog):
             return -1
 
         # Get the songs in the specified range
-        songs = spotifyauth.top_ten(str(ctx.author.id), time_range)
+        songs = await spotifyauth.top_ten(str(ctx.author.id), time_range)
 
         # If an error occurred send a message
         if songs['Error'] != 0:
@@ -575,12 +737,8 @@ class SpotifyAPI(commands.Cog):
             await ctx.send(genres['Error'])
             return -1
 
-        # Form inline code message to show song names and artists
-        messages = computations.form_message(sorted(list(genres['info'])))
-
-        # Send each message
-        for message in messages:
-            await ctx.send(message)
+        # Send inline code messages showing the genres
+        await outbox.send_lines(ctx, sorted(list(genres['info'])))
 
     @commands.command(name='lyrics')
     async def lyrics(self, ctx, *search):
@@ -589,27 +747,62 @@ class SpotifyAPI(commands.Cog):
         :arg search: The name (and artist) of the song
         """
         # Attempt to get the lyrics of the song from the genius website
-        result = genius.get_lyrics(' '.join(search))
+        result = await genius.get_lyrics(' '.join(search))
 
         # If an error occurred show the error
         if result['Error'] != 0:
             await ctx.send(result['Error'])
             return -1
 
-        # Create inline text to show the info
-        messages = computations.form_message(result['info'])
+        # Show the lyrics a page at a time
+        await paginator.paginate(ctx, result['info'], title=' '.join(search))
 
-        # Send each message
-        for message in messages:
-            await ctx.send(message)
+    @commands.command(name='findLyric')
+    async def find_lyric(self, ctx, *phrase):
+        """
+        Finds songs with a line in them
+        :arg phrase: The words of the line
+        """
+        if len(phrase) == 0:
+            await ctx.send("Give some words from the song to find")
+            return -1
+
+        result = await genius.find_lyric(' '.join(phrase))
+
+        # If an error occurred show the error
+        if result['Error'] != 0:
+            await ctx.send(result['Error'])
+            return -1
+
+        # Show the matching line of stored songs
+        songs = result['info']['songs']
+        if result['info']['stored']:
+            entries = [f"{title} by {artist}: {line}"
+                       for title, artist, line in songs]
+        else:
+            entries = [f"{title} by {artist}" for title, artist, _ in songs]
+
+        await outbox.send_lines(ctx, entries)
 
     @commands.command(name='curLyrics')
-    async def cur_lyrics(self, ctx):
+    async def cur_lyrics(self, ctx, mode: str = None):
         """
         Grabs the lyrics of the song being currently listened to
+        :arg mode: 'prefetch' - Also gets the lyrics of the songs
+                                queued next so they show instantly
         """
+        if mode not in [None, "prefetch"]:
+            await ctx.send(f"{mode} not a valid mode, try prefetch")
+            return -1
+
+        # Get the lyrics of the queued songs while this song is found
+        if mode == "prefetch":
+            task = asyncio.ensure_future(prefetch_lyrics(str(ctx.author.id)))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
         # Get the search value for the song
-        search_term = spotifyauth.cur_song(str(ctx.author.id))
+        search_term = await spotifyauth.cur_song(str(ctx.author.id))
 
         # If an error occurred show as such
         if search_term['Error'] != 0:
@@ -617,7 +810,7 @@ class SpotifyAPI(commands.Cog):
             return -1
 
         # Get the lyrics for the song
-        result = genius.get_lyrics(*search_term['info'])
+        result = await genius.get_lyrics(*search_term['info'])
 
         # If an error occurred show the error
         if result['Error'] != 0:
@@ -626,19 +819,16 @@ class SpotifyAPI(commands.Cog):
 
         print(result['info'])
 
-        # Create inline text to show the info
-        messages = computations.form_message(result['info'])
-
-        # Send each message
-        for message in messages:
-            await ctx.send(message)
+        # Show the lyrics a page at a time
+        await paginator.paginate(ctx, result['info'],
+                                 title=' by '.join(search_term['info']))
 
     @commands.command(name='optIn')
     async def opt_in(self, ctx):
         """
         Adds the user to the opt in list for weekly updated playlist
         """
-        computations.change_opt(str(ctx.author.id), True)
+        await computations.change_opt_async(str(ctx.author.id), True)
 
         await ctx.send("Opted in!")
 
@@ -647,7 +837,7 @@ class SpotifyAPI(commands.Cog):
         """
         Adds the user to the opt in list for weekly updated playlist
         """
-        computations.change_opt(str(ctx.author.id), False)
+        await computations.change_opt_async(str(ctx.author.id), False)
 
         await ctx.send("Opted out.")
 
@@ -656,7 +846,7 @@ class SpotifyAPI(commands.Cog):
         """
         Updates your top 99 playlist
         """
-        info = spotifyauth.top_playlist(str(ctx.author.id))
+        info = await spotifyauth.top_playlist(str(ctx.author.id))
 
         if info['Error'] != 0:
             await ctx.send(info['Error'])
@@ -664,6 +854,17 @@ class SpotifyAPI(commands.Cog):
 
         await ctx.send("Updated")
 
+    @commands.command(name='stats')
+    @commands.is_owner()
+    async def stats(self, ctx):
+        """
+        Shows how the bot's connections and caches are being used
+        """
+        await outbox.send_lines(ctx, stats_lines())
+
+
+# Create any missing tables
+database.ensure_schema()
 
 # Add cogs to bot
 bot.add_cog(AccountCommands())
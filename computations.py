@@ -1,43 +1,75 @@
 # Import standard libraries
 import os
+import time
 import collections
-import datetime
+import asyncio
+import threading
 
 # Import 3rd party libraries
-import psycopg2
+import numpy
+import psycopg2.extras
 
-# Import custom script
+# Import custom scripts
 import spotifyauth
+import database
+import overlap
+import sketch
 
-URL = os.getenv('DATABASE_URL')
+# Seconds a user's AuthData row is kept in memory
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))
 
+# Least seconds between updates of a progress message
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '2'))
 
-def check_user_exist(user: str) -> bool:
-    """Checks user exists
+# Cache of AuthData rows, personid -> (row, expiry time)
+_user_cache = {}
+_user_cache_lock = threading.Lock()
 
-    :arg user: The user to check (Required)
-    :return bool: Whether the user exists or not
-    Checks whether any information is stored about the user in the database
+
+def fetch_user(user: str) -> tuple:
+    """
+    :arg user: The user to get the row of (Required)
+    :return tuple: The AuthData row, or None if there isn't one
+    Gets the AuthData row for the user, using the cache
+    when the row has been read recently
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
+    key = str(user)
 
-    # Get all personid-s in the database where the
-    # id is the same as that of the user
-    statement = "SELECT personid FROM AuthData\nWHERE personid = %s;"
+    # If the row is cached and hasn't expired use that
+    with _user_cache_lock:
+        cached = _user_cache.get(key)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
 
-    cur.execute(statement, (user,))
+    # Get all the information about the user where the id matches
+    statement = "SELECT * FROM AuthData\nWHERE personid = %s;"
+    row = database.execute(statement, (user,), fetch="one")
+
+    with _user_cache_lock:
+        _user_cache[key] = (row, time.monotonic() + USER_CACHE_TTL)
 
-    # Get the results
-    person = cur.fetchone()
+    return row
 
-    # Close the connection to the database
-    cur.close()
-    con.close()
 
-    # If there was a matching id return True, else False
-    return person is not None
+def forget_user(user: str) -> None:
+    """
+    :arg user: The user to remove from the cache (Required)
+    :return None:
+    Removes the cached row of the user so the next read hits the database
+    """
+    with _user_cache_lock:
+        _user_cache.pop(str(user), None)
+
+
+def check_user_exist(user: str) -> bool:
+    """Checks user exists
+
+    :arg user: The user to check (Required)
+    :return bool: Whether the user exists or not
+    Checks whether any information is stored about the user in the database
+    """
+    # If there was a matching row return True, else False
+    return fetch_user(user) is not None
 
 
 def check_user(user: str, scope: str) -> bool:
@@ -47,29 +79,15 @@ def check_user(user: str, scope: str) -> bool:
     :return bool: Whether the user is new or not
     Returns whether the user is new or not/needs an updated scope
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
-
-    # Get all scope where the personid matches that of the user
-    statement = "SELECT scope FROM AuthData\nWHERE personid = %s;"
-
-    cur.execute(statement, (user,))
-
-    # Get the results
-    auth_scope = cur.fetchone()
-
-    # Close the connection to the database
-    cur.close()
-    con.close()
+    row = fetch_user(user)
 
     # If there is no scope return true
-    if auth_scope is None:
+    if row is None:
         return True
 
     # If there is a scope get each scope and test
     # if the wanted scope is a subset of the authorized scope
-    auth_scope = auth_scope[0].split()
+    auth_scope = row[4].split()
     if not set(scope.split()).issubset(set(auth_scope)):
         return True
     return False
@@ -86,20 +104,13 @@ def save_user(user: str, token: str, refresh: str,
     :return None:
     Saves details about the user
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
-
     # Insert a new user into the database
     statement = "INSERT INTO AuthData\nVALUES (%s, %s, %s, %s, %s);"
-    cur.execute(statement, (user, token,
-                refresh, time, scope))
+    database.execute(statement, (user, token, refresh, time, scope),
+                     commit=True)
 
-    # Close the connection to the database
-    # and commit changes to the database
-    cur.close()
-    con.commit()
-    con.close()
+    # The row has defaults set by the database so read it again
+    forget_user(user)
 
 
 def delete_user(user: str) -> None:
@@ -108,19 +119,18 @@ def delete_user(user: str) -> None:
     :return None:
     Deletes any stored information about the user
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
-
     # Delete from the database where the id matches that of the user
     statement = "DELETE FROM AuthData WHERE personid = %s;"
-    cur.execute(statement, (user,))
+    database.execute(statement, (user,), commit=True)
+
+    # Delete the stored library of the user
+    remove_playlists(user, list(get_playlist_snapshots(user)))
+    database.execute("DELETE FROM LibrarySketches WHERE personid = %s;",
+                     (str(user),), commit=True)
+    database.execute("DELETE FROM TrackOwners WHERE personid = %s;",
+                     (str(user),), commit=True)
 
-    # Close the connection to the database
-    # and commit changes to the database
-    cur.close()
-    con.commit()
-    con.close()
+    forget_user(user)
 
 
 def get_user(user: str) -> list:
@@ -129,21 +139,7 @@ def get_user(user: str) -> list:
     :return list: A list containing the information
     Grabs the information about the user from the database
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
-
-    # Get all the information about the user where the id matches
-    statement = "SELECT * FROM AuthData\nWHERE personid = %s;"
-    cur.execute(statement, (user,))
-
-    # Get the results
-    result = cur.fetchone()
-
-    # Close the connection to the database
-    cur.close()
-    con.close()
-    return result[1:-1]
+    return fetch_user(user)[1:-1]
 
 
 def update_user(user: str, token: str, refresh: str,
@@ -157,22 +153,24 @@ def update_user(user: str, token: str, refresh: str,
     :return None:
     Updates details about the user
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
-
     # Update the database where the id matches that of the user
     statement = "UPDATE AuthData\n"\
                 "SET authtoken = %s, refreshtoken = %s,"\
                 "time = %s, scope = %s\n"\
                 "WHERE personid = %s;"
-    cur.execute(statement, (token, refresh, time, scope, user,))
-
-    # Close the connection to the database
-    # and commit changes to the database
-    cur.close()
-    con.commit()
-    con.close()
+    database.execute(statement, (token, refresh, time, scope, user,),
+                     commit=True)
+
+    # Write the new details through to the cached row
+    key = str(user)
+    with _user_cache_lock:
+        cached = _user_cache.get(key)
+        if cached is not None and cached[0] is not None:
+            row = cached[0]
+            row = row[:1] + (token, refresh, time, scope) + row[5:]
+            _user_cache[key] = (row, cached[1])
+        else:
+            _user_cache.pop(key, None)
 
 
 def get_users_opt() -> list:
@@ -180,21 +178,11 @@ def get_users_opt() -> list:
     :return list: A list of users who have opted in
     Grabs the opted in users from the database
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
-
-    # Get all the information about the user where the id matches
+    # Get the id of every user who has opted in
     statement = "SELECT personid FROM AuthData\nWHERE OptIn = True;"
-    cur.execute(statement)
-
-    # Get the results
-    result = cur.fetchone()
+    result = database.execute(statement, fetch="all")
 
-    # Close the connection to the database
-    cur.close()
-    con.close()
-    return result
+    return [str(row[0]) for row in result]
 
 
 def change_opt(user: str, opt: bool) -> None:
@@ -203,23 +191,308 @@ def change_opt(user: str, opt: bool) -> None:
     :arg opt: The value to set opt to
     Changes the value of opt for the user
     """
-    # Open a connection to the database
-    con = psycopg2.connect(URL)
-    cur = con.cursor()
-
     # Get all the information about the user where the id matches
     statement = "UPDATE AuthData\nSET OptIn = %s\nWHERE PersonId = %s;"
-    cur.execute(statement, (opt, user,))
+    database.execute(statement, (opt, user,), commit=True)
+
+    forget_user(user)
+
+
+def get_playlist_snapshots(user: str) -> dict:
+    """
+    :arg user: The user to get the playlists of (Required)
+    :return dict: The snapshot id of each stored playlist
+    Gets the snapshot of every playlist stored for the user
+    """
+    statement = "SELECT playlistid, snapshotid FROM LibraryPlaylists\n"\
+                "WHERE personid = %s;"
+    result = database.execute(statement, (str(user),), fetch="all")
+
+    return dict(result)
+
+
+def save_playlist(user: str, playlist_id: str, snapshot_id: str,
+                  songs: dict) -> None:
+    """
+    :arg user: The user the playlist belongs to (Required)
+    :arg playlist_id: The id of the playlist (Required)
+    :arg snapshot_id: The snapshot of the playlist the songs are from (Required)
+    :arg songs: A dict of song id to the name and artist of the song (Required)
+    :return None:
+    Replaces the stored songs of a playlist with the given songs
+    """
+    user = str(user)
+    rows = [(user, playlist_id, song_id, name, artist)
+            for song_id, (name, artist) in songs.items()]
+
+    # Replace the songs and snapshot in one transaction
+    with database.connection() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM LibraryTracks\n"
+                    "WHERE personid = %s AND playlistid = %s;",
+                    (user, playlist_id))
+        psycopg2.extras.execute_values(cur, "INSERT INTO LibraryTracks\n"
+                                            "VALUES %s;", rows)
+        cur.execute("INSERT INTO LibraryPlaylists\nVALUES (%s, %s, %s)\n"
+                    "ON CONFLICT (personid, playlistid)\n"
+                    "DO UPDATE SET snapshotid = EXCLUDED.snapshotid;",
+                    (user, playlist_id, snapshot_id))
+        cur.close()
+        con.commit()
+
+
+def remove_playlists(user: str, playlist_ids: list) -> None:
+    """
+    :arg user: The user the playlists belong to (Required)
+    :arg playlist_ids: The ids of the playlists to remove (Required)
+    :return None:
+    Removes playlists from the user's stored library
+    """
+    user = str(user)
+    with database.connection() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM LibraryTracks\n"
+                    "WHERE personid = %s AND playlistid = ANY(%s);",
+                    (user, playlist_ids))
+        cur.execute("DELETE FROM LibraryPlaylists\n"
+                    "WHERE personid = %s AND playlistid = ANY(%s);",
+                    (user, playlist_ids))
+        cur.close()
+        con.commit()
+
+
+def index_library(user: str) -> None:
+    """
+    :arg user: The user to index the library of (Required)
+    :return None:
+    Updates which songs the user owns in the song index to match
+    their stored library, then updates their sketch
+    """
+    user = str(user)
+    with database.connection() as con:
+        cur = con.cursor()
+
+        # Remove songs the user no longer has
+        cur.execute("DELETE FROM TrackOwners AS owners\n"
+                    "WHERE personid = %s AND NOT EXISTS (\n"
+                    "    SELECT 1 FROM LibraryTracks AS tracks\n"
+                    "    WHERE tracks.personid = owners.personid\n"
+                    "    AND tracks.trackid = owners.trackid);", (user,))
+
+        # Add the songs the user has gained
+        cur.execute("INSERT INTO TrackOwners\n"
+                    "SELECT DISTINCT trackid, personid FROM LibraryTracks\n"
+                    "WHERE personid = %s\n"
+                    "ON CONFLICT DO NOTHING;", (user,))
+
+        cur.execute("SELECT trackid FROM TrackOwners\n"
+                    "WHERE personid = %s;", (user,))
+        song_ids = [row[0] for row in cur.fetchall()]
+        cur.close()
+        con.commit()
+
+    save_sketch(user, song_ids)
+
+
+def check_indexed(user: str) -> bool:
+    """
+    :arg user: The user to check (Required)
+    :return bool: Whether the user's library has been indexed
+    Checks whether the user has a current sketch, which is saved
+    every time their library is indexed
+    """
+    statement = "SELECT 1 FROM LibrarySketches\n"\
+                "WHERE personid = %s AND version = %s;"
+    return database.execute(statement, (str(user), sketch.VERSION),
+                            fetch="one") is not None
+
+
+def get_owners(song_id: str) -> list:
+    """
+    :arg song_id: The id of the song (Required)
+    :return list: The ids of the users who have the song
+    Gets every user whose stored library has the song
+    """
+    statement = "SELECT personid FROM TrackOwners\nWHERE trackid = %s;"
+    result = database.execute(statement, (song_id,), fetch="all")
+
+    return [row[0] for row in result]
+
+
+def shared_songs(users: list) -> dict:
+    """
+    :arg users: The users to find the shared songs of (Required)
+    :return dict: The songs that overlap exactly
+    Finds the songs every user has from the song index
+    """
+    users = [str(user) for user in users]
+
+    # Find the songs owned by every user, with names from the first user
+    statement = "SELECT DISTINCT ON (tracks.trackid)\n"\
+                "       tracks.trackid, tracks.name, tracks.artist\n"\
+                "FROM (SELECT trackid FROM TrackOwners\n"\
+                "      WHERE personid = ANY(%s)\n"\
+                "      GROUP BY trackid HAVING COUNT(*) = %s) AS shared\n"\
+                "JOIN LibraryTracks AS tracks\n"\
+                "ON tracks.trackid = shared.trackid"\
+                " AND tracks.personid = %s;"
+    songs = database.execute(statement, (users, len(set(users)), users[0]),
+                             fetch="all")
+
+    # Find the total number of songs
+    statement = "SELECT COUNT(*) FROM TrackOwners\nWHERE personid = ANY(%s);"
+    total_songs = database.execute(statement, (users,), fetch="one")[0]
+
+    # Find the percentage overlap
+    overlap_percentage = format(len(songs) / max(total_songs, 1) * 100, '.3')
+
+    song_details = [[[name, artist], song_id]
+                    for song_id, name, artist in songs]
+
+    return {"info": {"songs": song_details, "total": len(songs),
+                     "percentage": overlap_percentage}, "Error": 0}
+
+
+def save_sketch(user: str, song_ids) -> None:
+    """
+    :arg user: The user the songs belong to (Required)
+    :arg song_ids: The ids of every song in the user's library (Required)
+    :return None:
+    Creates and stores the sketch of the user's library
+    """
+    song_ids = set(song_ids)
+    signature = sketch.to_bytes(sketch.signature(song_ids))
+
+    statement = "INSERT INTO LibrarySketches"\
+                " (personid, signature, size, version)\n"\
+                "VALUES (%s, %s, %s, %s)\n"\
+                "ON CONFLICT (personid)\n"\
+                "DO UPDATE SET signature = EXCLUDED.signature,"\
+                " size = EXCLUDED.size, version = EXCLUDED.version;"
+    database.execute(statement, (str(user), psycopg2.Binary(signature),
+                                 len(song_ids), sketch.VERSION), commit=True)
+
+
+def get_sketches(users: list) -> dict:
+    """
+    :arg users: The users to get the sketches of (Required)
+    :return dict: A dict of user to their signature and library size
+    Gets the stored sketches of the users
+    """
+    statement = "SELECT personid, signature, size FROM LibrarySketches\n"\
+                "WHERE personid = ANY(%s) AND version = %s;"
+    result = database.execute(statement, ([str(user) for user in users],
+                                          sketch.VERSION), fetch="all")
+
+    return {user: [sketch.from_bytes(signature), size]
+            for user, signature, size in result}
+
+
+def get_library_ids(users: list) -> dict:
+    """
+    :arg users: The users to get the songs of (Required)
+    :return dict: A dict of user to the set of their song ids
+    Gets the ids of every song stored for each of the users
+    """
+    statement = "SELECT DISTINCT personid, trackid FROM LibraryTracks\n"\
+                "WHERE personid = ANY(%s);"
+    result = database.execute(statement, ([str(user) for user in users],),
+                              fetch="all")
+
+    libraries = collections.defaultdict(set)
+    for user, song_id in result:
+        libraries[user].add(song_id)
+
+    return dict(libraries)
+
+
+async def check_user_exist_async(user: str) -> bool:
+    """
+    :arg user: The user to check (Required)
+    :return bool: Whether the user exists or not
+    Awaitable version of check_user_exist
+    """
+    return await database.run(check_user_exist, user)
+
+
+async def check_user_async(user: str, scope: str) -> bool:
+    """
+    :arg user: The user to check (Required)
+    :arg scope: The scope to check (Required)
+    :return bool: Whether the user is new or not
+    Awaitable version of check_user
+    """
+    return await database.run(check_user, user, scope)
+
+
+async def save_user_async(user: str, token: str, refresh: str,
+                          time: float, scope: str) -> None:
+    """
+    :arg user: The user to save details about (Required)
+    :arg token: The auth token for the user (Required)
+    :arg refresh: The refresh token for the user (Required)
+    :arg time: Time the token was received (Required)
+    :arg scope: The scope of the token (Required)
+    :return None:
+    Awaitable version of save_user
+    """
+    await database.run(save_user, user, token, refresh, time, scope)
 
-    # Close the connection to the database
-    cur.close()
-    con.commit()
-    con.close()
+
+async def delete_user_async(user: str) -> None:
+    """
+    :arg user: The user to delete the data about (Required)
+    :return None:
+    Awaitable version of delete_user
+    """
+    await database.run(delete_user, user)
 
 
-async def show_overlap(*users) -> dict:
+async def get_user_async(user: str) -> list:
+    """
+    :arg user: The user to get information about (Required)
+    :return list: A list containing the information
+    Awaitable version of get_user
+    """
+    return await database.run(get_user, user)
+
+
+async def update_user_async(user: str, token: str, refresh: str,
+                            time: float, scope: str) -> None:
+    """
+    :arg user: The user to update details about (Required)
+    :arg token: The auth token for the user (Required)
+    :arg refresh: The refresh token for the user (Required)
+    :arg time: Time the token was received (Required)
+    :arg scope: The scope of the token (Required)
+    :return None:
+    Awaitable version of update_user
+    """
+    await database.run(update_user, user, token, refresh, time, scope)
+
+
+async def get_users_opt_async() -> list:
+    """
+    :return list: A list of users who have opted in
+    Awaitable version of get_users_opt
+    """
+    return await database.run(get_users_opt)
+
+
+async def change_opt_async(user: str, opt: bool) -> None:
+    """
+    :arg user: The user to change the opt for
+    :arg opt: The value to set opt to
+    Awaitable version of change_opt
+    """
+    await database.run(change_opt, user, opt)
+
+
+async def show_overlap(*users, progress=None) -> dict:
     """
     :arg users: The id of users to compare (Required)
+    :arg progress: Coroutine function called with the users done,
+                   the total users and the tracks fetched so far (Optional)
     :return list: Contains the songs that overlap,
     The total songs that overlap and the percent overlap
     Gives information about the overlap of song taste between 2 users
@@ -229,13 +502,39 @@ async def show_overlap(*users) -> dict:
         names = [user[1] for user in users]
         users = [user[0] for user in users]
 
-    # For each user grab their songs via the api
-    user_songs = []
-    for user in users:
-        response = await spotifyauth.get_user_songs(str(user))
-        if response['Error'] == 0:
-            user_songs.append(response['info'])
-        else:
+    # Keep track of how far through the fetching is
+    fetched = {"users": 0, "tracks": 0}
+    reported = {"time": time.monotonic(), "task": None}
+
+    def add_tracks(count):
+        fetched["tracks"] += count
+
+        # Show the tracks fetched every so often, skipping
+        # pages that arrive while the last update is being sent
+        task = reported["task"]
+        if (progress is None or (task is not None and not task.done())
+                or time.monotonic() - reported["time"] < PROGRESS_INTERVAL):
+            return
+        reported["time"] = time.monotonic()
+        reported["task"] = asyncio.ensure_future(
+            progress(fetched["users"], len(users), fetched["tracks"]))
+
+    async def sync_songs(user):
+        response = await spotifyauth.sync_library(str(user), add_tracks)
+        fetched["users"] += 1
+        if progress is not None:
+            # Let an older update finish so it doesn't overwrite this one
+            if reported["task"] is not None:
+                await reported["task"]
+            reported["time"] = time.monotonic()
+            await progress(fetched["users"], len(users), fetched["tracks"])
+        return response
+
+    # Bring every user's stored library up to date at the same time
+    responses = await asyncio.gather(*[sync_songs(user) for user in users])
+
+    for user, response in zip(users, responses):
+        if response['Error'] != 0:
             if names is not None:
                 error = response['Error']
                 error = error.replace("User", names[users.index(user)])
@@ -243,42 +542,101 @@ async def show_overlap(*users) -> dict:
                 return response
             return response
 
-    overlap = intersection(user_songs)
-
-    return overlap
+    # Find the overlap with a single query on the song index
+    return await database.run(shared_songs, users)
 
 
 async def playlist_overlap(user: str, accuracy: str,
-                           *playlist_ids: str) -> dict:
+                           *playlist_ids: str, cutoff: float = None) -> dict:
     """
     :arg user: The user to authenticate (Required)
     :arg accuracy: The type of intersection to find (Required)
     :arg playlist_ids: The ids of the playlists to compare (Required)
+    :arg cutoff: The number of playlists a song needs to be in
+                 for a rough intersection (Optional)
     :return dict: The overlapping songs
     Finds the intersections between the playlists
     """
-    tracks = []
+    user_songs = []
     for playlist_id in playlist_ids:
-        playlist_songs = await spotifyauth.get_playlist_songs(user,
-                                                              playlist_id,
-                                                              False)
-        if playlist_songs['Error'] != 0:
-            return {'info': [], 'Error': playlist_songs['Error']}
-        tracks.append(playlist_songs['info'])
+        # Add the songs of each page as it arrives
+        songs = {}
+        async for page in spotifyauth.iter_playlist_songs(user, playlist_id,
+                                                          False):
+            if page['Error'] != 0:
+                return {'info': [], 'Error': page['Error']}
+
+            for track in page['info']:
+                if not track.is_local:
+                    songs[track.id] = [track.name, track.artist]
 
-    user_songs = []
-    for play_tracks in tracks:
-        track_ids = [x['track']['id']
-                     for x in play_tracks if not x['track']['is_local']]
-        track_dict = [[x['track']['name'], x['track']['artists'][0]['name']]
-                      for x in play_tracks if not x['track']['is_local']]
-        songs = dict(zip(track_ids, track_dict))
         user_songs.append(songs)
 
     if accuracy == "exact":
         return intersection(user_songs)
 
-    return ordered_songs(user_songs)
+    return ordered_songs(user_songs, cutoff)
+
+
+async def guild_similarity(users: list) -> dict:
+    """
+    :arg users: The ids and names of the users to compare (Required)
+    :return dict: Each pair of users ordered by how similar they are,
+    and the users without a stored library
+    Compares the stored libraries of every pair of users
+    """
+    names = {str(user_id): name for user_id, name in users}
+
+    libraries = await database.run(get_library_ids, list(names))
+
+    # Users who haven't had their library stored can't be compared
+    missing = [name for user_id, name in names.items()
+               if user_id not in libraries]
+    compared = [user_id for user_id in names if user_id in libraries]
+
+    if len(compared) < 2:
+        return {"info": [], "Error": "Not enough users with a stored library,"
+                                     " use `+compare` to store one"}
+
+    # Work out the similarity away from the event loop
+    loop = asyncio.get_running_loop()
+    pairs = await loop.run_in_executor(None, overlap.pairwise_similarity,
+                                       [libraries[user_id]
+                                        for user_id in compared])
+
+    pair_info = [[names[compared[first]], names[compared[second]],
+                  format(jaccard * 100, '.3'), shared]
+                 for first, second, jaccard, shared in pairs]
+
+    return {"info": {"pairs": pair_info, "missing": missing}, "Error": 0}
+
+
+async def estimate_overlap(*users) -> dict:
+    """
+    :arg users: The id of users to compare (Required)
+    :return dict: The estimated percentage and number of songs that
+    overlap, or None as the info if a user has no sketch
+    Estimates the overlap of the users from their stored sketches
+    without making any requests to spotify
+    """
+    if isinstance(users[0], list):
+        users = [user[0] for user in users]
+    users = [str(user) for user in users]
+
+    sketches = await database.run(get_sketches, users)
+
+    # Can't estimate without a sketch for everyone
+    if any(user not in sketches for user in users):
+        return {"info": None, "Error": 0}
+
+    signatures = [sketches[user][0] for user in users]
+    sizes = [sketches[user][1] for user in users]
+
+    shared, _, margin = sketch.estimate(signatures, sizes)
+    overlap_percentage = format(shared / max(sum(sizes), 1) * 100, '.3')
+
+    return {"info": {"total": round(shared), "margin": round(margin),
+                     "percentage": overlap_percentage}, "Error": 0}
 
 
 def intersection(song_list: list) -> dict:
@@ -288,54 +646,67 @@ def intersection(song_list: list) -> dict:
     Finds the intersection of the songs
     """
 
-    # Find the set intersection between all the user's songs
-    songs = set(song_list[0].keys())
-    for i in range(1, len(song_list)):
-        songs = set(song_list[i].keys()) & songs
+    # Find the intersection between all the user's songs
+    songs = overlap.intersect(song_list)
 
     # Find the total number of songs
-    total_songs = sum(map(len, [song_set for song_set in song_list]))
+    total_songs = sum(map(len, song_list))
 
     # Find the percentage overlap
     overlap_percentage = format((len(songs) / total_songs) * 100, '.3')
 
-    # Find song names with id dict
-    id_dict = {}
-    for song_dict in song_list:
-        id_dict.update(song_dict)
-
-    # Get all the names from the dict
-    song_details = [[id_dict[song_id], song_id] for song_id in songs]
+    # Every shared song is in the first dict, so only
+    # the names of the shared songs need looking up
+    song_details = [[song_list[0][song_id], song_id] for song_id in songs]
 
     # Return the information
     return {"info": {"songs": song_details, "total": len(songs),
                      "percentage": overlap_percentage}, "Error": 0}
 
 
-def ordered_songs(song_list: list) -> dict:
+def ordered_songs(song_list: list, cutoff: float = None) -> dict:
     """
     :arg song_list: List of song lists to find the intersection of (Required)
+    :arg cutoff: The number of lists a song has to be in, defaults
+                 to half of the lists and at least 2 (Optional)
     :return dict: The songs that overlap with more than half of the lists
     Finds the intersection of the songs
     """
-    songs = []
-    for song_set in song_list:
-        songs += list(set(song_set))
+    if len(song_list) == 0:
+        return {"info": {"songs": []}, "Error": 0}
+
+    if cutoff is None:
+        cutoff = max(len(song_list)/2, 2)
+
+    # Give every song a column of the membership matrix
+    interner = overlap.IdInterner()
+    columns = [numpy.fromiter((interner.intern(song) for song in song_set),
+                              dtype=numpy.int64, count=len(song_set))
+               for song_set in song_list]
 
-    song_counts = collections.Counter(songs)
+    # Mark which lists each song is in
+    membership = numpy.zeros((len(song_list), len(interner.ids)), dtype=bool)
+    for row, song_columns in enumerate(columns):
+        membership[row, song_columns] = True
 
-    num_cutoff = max(len(song_list)/2, 2)
-    filtered_songs = [[song_counts[song], song]
-                      for song in song_counts.keys()
-                      if song_counts[song] >= num_cutoff]
+    # Count the lists holding each song and keep those over the cutoff
+    song_counts = membership.sum(axis=0)
+    kept = numpy.flatnonzero(song_counts >= cutoff)
 
-    song_dict = {}
-    for sub_dict in song_list:
-        song_dict.update(sub_dict)
+    # No songs are shared by enough lists
+    if kept.size == 0:
+        return {"info": {"songs": []}, "Error": 0}
 
-    song_info = sorted([[song_count, song_dict[song], song]
-                        for song_count, song in filtered_songs],
-                       key=lambda x: x[0], reverse=True)
+    # Order by count, most common first
+    kept = kept[numpy.argsort(-song_counts[kept], kind='stable')]
+
+    # Get the name of each song from the first list holding it
+    first_list = membership[:, kept].argmax(axis=0)
+
+    song_info = [[int(song_counts[column]),
+                  song_list[row][interner.ids[column]],
+                  interner.ids[column]]
+                 for column, row in zip(kept.tolist(), first_list.tolist())]
 
     return {"info": {"songs": song_info}, "Error": 0}
 
@@ -402,22 +773,3 @@ def id_to_uri(id_type: str, id_: str) -> str:
     """
     uri = f"spotify:{id_type}:{id_}"
     return uri
-
-
-def find_time(date) -> int:
-    """
-    :return int: Time to wait
-    Finds the time in seconds to wait until the next update
-    for top99 playlist
-    """
-    if date.weekday() == 6 and date.hour >= 14:
-        wait_time = 7
-    else:
-        wait_time = 6 - date.weekday()
-
-    aim = date + datetime.timedelta(days=wait_time)
-    print(aim)
-
-    total_time = (aim - date).total_seconds()
-
-    return int(total_time)
@@ -0,0 +1,325 @@
+# Import standard libraries
+import os
+import time
+import threading
+import asyncio
+import functools
+import contextlib
+import concurrent.futures
+
+# Import 3rd party libraries
+import psycopg2
+import psycopg2.pool
+
+URL = os.getenv('DATABASE_URL')
+
+# Constants for the size of the connection pool
+POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+# Seconds a connection can sit idle before it is health checked
+HEALTH_CHECK_AGE = float(os.getenv('DB_HEALTH_CHECK_AGE', '30'))
+
+# Number of times to retry a statement after a dropped connection
+RECONNECT_AMOUNT = 1
+
+# The pool is created lazily so importing doesn't need a database
+_pool = None
+_pool_lock = threading.Lock()
+
+# Limits the number of borrowers so callers wait instead of failing
+_slots = threading.BoundedSemaphore(POOL_MAX)
+
+# Time each connection was last handed back to the pool
+_last_used = {}
+
+# Dedicated threads for running queries off of the event loop,
+# sized to the pool so queued queries never wait on a connection
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=POOL_MAX,
+                                                  thread_name_prefix="db")
+
+# Tables created by the bot, AuthData is set up separately
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS LibraryPlaylists (\n"
+    "    personid TEXT NOT NULL,\n"
+    "    playlistid TEXT NOT NULL,\n"
+    "    snapshotid TEXT NOT NULL,\n"
+    "    PRIMARY KEY (personid, playlistid)\n"
+    ");",
+    "CREATE TABLE IF NOT EXISTS LibraryTracks (\n"
+    "    personid TEXT NOT NULL,\n"
+    "    playlistid TEXT NOT NULL,\n"
+    "    trackid TEXT NOT NULL,\n"
+    "    name TEXT,\n"
+    "    artist TEXT\n"
+    ");",
+    "CREATE INDEX IF NOT EXISTS LibraryTracksPlaylist\n"
+    "ON LibraryTracks (personid, playlistid);",
+    "CREATE TABLE IF NOT EXISTS TrackOwners (\n"
+    "    trackid TEXT NOT NULL,\n"
+    "    personid TEXT NOT NULL,\n"
+    "    PRIMARY KEY (trackid, personid)\n"
+    ");",
+    "CREATE INDEX IF NOT EXISTS TrackOwnersPerson\n"
+    "ON TrackOwners (personid);",
+    "CREATE TABLE IF NOT EXISTS LibrarySketches (\n"
+    "    personid TEXT PRIMARY KEY,\n"
+    "    signature BYTEA NOT NULL,\n"
+    "    size INTEGER NOT NULL\n"
+    ");",
+    "ALTER TABLE LibrarySketches\n"
+    "ADD COLUMN IF NOT EXISTS version SMALLINT NOT NULL DEFAULT 1;",
+    "CREATE TABLE IF NOT EXISTS Lyrics (\n"
+    "    songid INTEGER PRIMARY KEY,\n"
+    "    title TEXT,\n"
+    "    artist TEXT,\n"
+    "    lines TEXT[] NOT NULL,\n"
+    "    fetched DOUBLE PRECISION NOT NULL,\n"
+    "    used DOUBLE PRECISION NOT NULL\n"
+    ");",
+    "CREATE INDEX IF NOT EXISTS LyricsUsed\n"
+    "ON Lyrics (used);",
+    "CREATE TABLE IF NOT EXISTS LyricsKeys (\n"
+    "    searchkey TEXT PRIMARY KEY,\n"
+    "    songid INTEGER NOT NULL\n"
+    "        REFERENCES Lyrics (songid) ON DELETE CASCADE\n"
+    ");",
+    "ALTER TABLE Lyrics\n"
+    "ADD COLUMN IF NOT EXISTS document TSVECTOR;",
+    "UPDATE Lyrics\n"
+    "SET document = to_tsvector('english', coalesce(title, '') || E'\\n'"
+    " || array_to_string(lines, E'\\n'))\n"
+    "WHERE document IS NULL;",
+    "CREATE INDEX IF NOT EXISTS LyricsDocument\n"
+    "ON Lyrics USING GIN (document);",
+    "CREATE TABLE IF NOT EXISTS Schedules (\n"
+    "    name TEXT PRIMARY KEY,\n"
+    "    nextrun DOUBLE PRECISION NOT NULL,\n"
+    "    lastrun DOUBLE PRECISION,\n"
+    "    claimeduntil DOUBLE PRECISION\n"
+    ");",
+]
+
+# Counters describing how the pool is being used
+metrics = {"borrowed": 0, "in_use": 0, "waits": 0, "exhausted": 0,
+           "reconnects": 0, "wait_time": 0.0}
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str, amount: float = 1) -> None:
+    """
+    :arg name: The metric to change (Required)
+    :arg amount: The amount to add (Optional)
+    :return None:
+    Adds to a metric, locked as the database threads share them
+    """
+    with _metrics_lock:
+        metrics[name] += amount
+
+
+def get_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    """
+    :return ThreadedConnectionPool: The shared connection pool
+    Creates the connection pool on first use and returns it
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = psycopg2.pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX,
+                                                         URL)
+    return _pool
+
+
+def close_pool() -> None:
+    """
+    :return None:
+    Closes every connection held by the pool
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
+
+
+def healthy(con) -> bool:
+    """
+    :arg con: The connection to check (Required)
+    :return bool: Whether the connection can be used
+    Checks a connection is still open, pinging the server
+    if the connection has been idle for a while
+    """
+    if con.closed:
+        return False
+
+    # Recently used connections are assumed to be fine
+    if time.monotonic() - _last_used.get(id(con), 0) < HEALTH_CHECK_AGE:
+        return True
+
+    try:
+        cur = con.cursor()
+        cur.execute("SELECT 1;")
+        cur.close()
+        con.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _acquire():
+    """
+    :return connection: A healthy connection from the pool
+    Waits for a free slot in the pool and borrows a connection,
+    replacing any connection that fails the health check
+    """
+    # Try to get a slot straight away, otherwise record the wait
+    start = time.monotonic()
+    if not _slots.acquire(blocking=False):
+        _count("waits")
+        if not _slots.acquire(timeout=POOL_TIMEOUT):
+            _count("exhausted")
+            raise psycopg2.pool.PoolError("Connection pool exhausted")
+        _count("wait_time", time.monotonic() - start)
+
+    try:
+        pool = get_pool()
+        con = pool.getconn()
+
+        # Swap out broken connections until a working one is found,
+        # after a server restart every idle connection can be broken
+        attempts = 1
+        while not healthy(con):
+            _count("reconnects")
+            pool.putconn(con, close=True)
+            if attempts > POOL_MAX:
+                raise psycopg2.OperationalError("No working connection")
+            con = pool.getconn()
+            attempts += 1
+    except Exception:
+        _slots.release()
+        raise
+
+    _count("borrowed")
+    _count("in_use")
+    return con
+
+
+def _release(con, broken: bool = False) -> None:
+    """
+    :arg con: The connection to give back (Required)
+    :arg broken: Whether the connection should be thrown away (Optional)
+    :return None:
+    Returns a connection to the pool
+    """
+    try:
+        _last_used[id(con)] = time.monotonic()
+        get_pool().putconn(con, close=broken or bool(con.closed))
+    finally:
+        _count("in_use", -1)
+        _slots.release()
+
+
+@contextlib.contextmanager
+def connection():
+    """
+    :return connection: A pooled connection
+    Lends out a connection from the pool, rolling back on errors
+    and dropping connections that have been closed by the server
+    """
+    con = _acquire()
+    broken = False
+    try:
+        yield con
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        if not con.closed:
+            con.rollback()
+        raise
+    finally:
+        _release(con, broken)
+
+
+def execute(statement: str, args: tuple = (), fetch: str = None,
+            commit: bool = False):
+    """
+    :arg statement: The sql statement to run (Required)
+    :arg args: The arguments for the statement (Optional)
+    :arg fetch: 'one', 'all' or None for what results to return (Optional)
+    :arg commit: Whether to commit the statement (Optional)
+    :return: The fetched results, if any
+    Runs a statement on a pooled connection, reconnecting
+    once if the connection dropped
+    """
+    retries = RECONNECT_AMOUNT
+    while True:
+        try:
+            with connection() as con:
+                cur = con.cursor()
+                cur.execute(statement, args)
+
+                # Get the results
+                result = None
+                if fetch == "one":
+                    result = cur.fetchone()
+                elif fetch == "all":
+                    result = cur.fetchall()
+                cur.close()
+
+                if commit:
+                    con.commit()
+                else:
+                    con.rollback()
+                return result
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            if retries == 0:
+                raise
+            retries -= 1
+            _count("reconnects")
+
+
+def ensure_schema() -> None:
+    """
+    :return None:
+    Creates any of the bot's tables which don't exist yet
+    """
+    with connection() as con:
+        cur = con.cursor()
+        for statement in SCHEMA:
+            cur.execute(statement)
+        cur.close()
+        con.commit()
+
+
+def pool_stats() -> dict:
+    """
+    :return dict: Information about the connection pool
+    Gets a snapshot of the pool metrics
+    """
+    with _metrics_lock:
+        stats = dict(metrics)
+    stats["size"] = POOL_MAX
+    stats["available"] = POOL_MAX - stats["in_use"]
+    return stats
+
+
+async def run(func, *args, **kwargs):
+    """
+    :arg func: The blocking database function to run (Required)
+    :arg args: The arguments to pass to the function (Optional)
+    :arg kwargs: The keyword arguments to pass to the function (Optional)
+    :return: The result of the function
+    Runs a blocking database function in the database threads
+    so that the event loop is not blocked
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor,
+                                      functools.partial(func, *args,
+                                                        **kwargs))
@@ -1,9 +1,14 @@
+# Import standard libraries
+import os
+import asyncio
+
 # Import libraries
-import requests
-import bs4
+import aiohttp
+import lxml.html
 
-# Import from libraries
-from bs4 import BeautifulSoup
+# Import custom scripts
+import lyricscache
+import database
 
 # Auth code for authorization
 code = "_1YXXDNRoLkdYrWlMaVZcs4BwfX_srqX2duNPqsdSrVhe-Lea8kKuSSnGMDCQaCM"
@@ -14,22 +19,83 @@ header = {"Authorization": f"Bearer {code}"}
 # Base url of site
 base = "http://api.genius.com"
 
-# TODO add more searches to try and get the correct song
+# Seconds to wait for a genius request before giving up
+GENIUS_TIMEOUT = float(os.getenv('GENIUS_TIMEOUT', '10'))
+
+# Maximum number of connections open to genius
+GENIUS_CONCURRENCY = int(os.getenv('GENIUS_CONCURRENCY', '8'))
+
+# Where the lyrics are on old and new song pages, matching lyrics
+# as one of the classes, the new containers have a generated
+# suffix so only the prefix is matched
+OLD_LYRICS_PATH = ("//div[contains(concat(' ', normalize-space(@class), ' '),"
+                   " ' lyrics ')]//p")
+LYRICS_PATH = ("//div[contains(concat(' ', normalize-space(@class)),"
+               " ' Lyrics__Container')]")
+
+# Number of search results whose pages are fetched at once
+CANDIDATES = int(os.getenv('GENIUS_CANDIDATES', '3'))
+
+# Session shared by every request so connections are kept alive
+_session = None
 
+# Number of queued songs whose lyrics are fetched ahead of time
+PREFETCH_AMOUNT = int(os.getenv('LYRICS_PREFETCH_AMOUNT', '5'))
 
-def search(search_term: str) -> dict:
+# Lookups running for each search, so repeated searches share one lookup
+_in_flight = {}
+
+# Number of songs prefetched at once across the bot
+PREFETCH_CONCURRENCY = int(os.getenv('LYRICS_PREFETCH_CONCURRENCY', '2'))
+_prefetch_slots = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    :return ClientSession: The shared http session
+    Creates the shared session on first use and returns it
+    """
+    global _session
+
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=GENIUS_CONCURRENCY,
+                                         keepalive_timeout=60,
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=GENIUS_TIMEOUT)
+        _session = aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout)
+    return _session
+
+
+async def close() -> None:
+    """
+    :return None:
+    Closes the shared session
+    """
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def search(search_term: str) -> dict:
     """
     :arg search_term: The name of the song to find the lyrics for (Required)
     :return dict: A dict containing the result of the search
     Searches through genius for the song and returns the dict
     """
-    # Create url for request
-    url = f"{base}/search?q={search_term}"
+    session = await get_session()
 
-    # Create the request to get the lyrics url and get the json
-    r = requests.get(url, headers=header).json()
+    # Get the search results, the term is encoded by aiohttp
+    try:
+        async with session.get(f"{base}/search", params={"q": search_term},
+                               headers=header) as response:
+            r = await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return {'info': [], 'Error': 'Search broke'}
 
-    if 'response' not in r:
+    if not isinstance(r, dict) or 'response' not in r:
         return {'info': [], 'Error': 'Search broke'}
 
     # Get the returned results
@@ -38,109 +104,225 @@ def search(search_term: str) -> dict:
     return {'info': results, 'Error': 0}
 
 
-def encode_search(name: str, artist: str = None) -> str:
+def search_terms(name: str, artist: str = None) -> list:
     """
     :arg name: Name of song (Required)
     :arg artist: Artist of song (Optional)
-    Encodes search for use in url
+    :return list: The searches to try, best first
+    Creates the searches to make for a song
     """
-    # Convert spaces to %20 for url
     if artist is not None:
-        encoded_term = str(name+" "+artist).replace(" ", "%20")
-    else:
-        encoded_term = str(name).replace(" ", "%20")
+        return [f"{name} {artist}", name]
+    return [name]
 
-    return encoded_term
+
+def artist_matches(song: dict, artist: str) -> bool:
+    """
+    :arg song: A song from the search results (Required)
+    :arg artist: Artist of song (Required)
+    :return bool: Whether the song is by the artist
+    Checks the artist is in the song's primary artist,
+    ignoring the zero width spaces genius adds
+    """
+    name = [letter for letter in song['primary_artist']['name'].lower()
+            if ord(letter) != 8203]
+    return artist.lower() in ''.join(name)
 
 
-def get_lyrics(search_term: str, artist: str = None) -> dict:
+async def find_candidates(search_term: str, artist: str = None) -> dict:
     """
-    :arg search_term: The name of the song to find the lyrics for (Required)
+    :arg search_term: The name of the song (Required)
     :arg artist: Artist of song (Optional)
-    :return list: A list containing the lines of the song
-    Searches the genius website to get the lyrics of a song
+    :return dict: The songs that could be the one searched for, best first
+    Runs every search at once and merges the results
     """
-    search_term = encode_search(search_term, artist)
+    searches = await asyncio.gather(*[search(term) for term
+                                      in search_terms(search_term, artist)])
 
-    results = search(search_term)
+    # Only fail if every search failed
+    if all(results['Error'] != 0 for results in searches):
+        return searches[0]
 
-    # If there are no results return an error
-    if results['Error'] != 0:
-        return results
-    elif len(results['info']) == 0:
-        results['info'] = []
-        results['Error'] = "No results from search"
+    # Merge the results in order, without repeating songs
+    songs = []
+    seen = set()
+    for results in searches:
+        for result in results['info']:
+            song = result['result']
+            if song['id'] not in seen:
+                seen.add(song['id'])
+                songs.append(song)
 
-    results = results['info']
-
-    lyrics_url = None
+    if len(songs) == 0:
+        return {'info': [], 'Error': "No results from search"}
 
     # TODO improve this for better search accuracy
-    # Get the url from the results
+    # Only keep songs by the artist if one was given
     if artist is not None:
-        found = False
-        for result in results:
-            name = [letter for letter in
-                    result['result']['primary_artist']['name'].lower()
-                    if ord(letter) != 8203]
-            if artist.lower() in ''.join(name):
-                lyrics_url = result['result']['url']
-                found = True
-                break
-        if not found:
+        songs = [song for song in songs if artist_matches(song, artist)]
+        if len(songs) == 0:
             return {'info': [], 'Error': 'Lyrics not found'}
-    else:
-        lyrics_url = results[0]['result']['url']
+
+    return {'info': songs[:CANDIDATES], 'Error': 0}
+
+
+async def fetch_lyrics(song: dict) -> list:
+    """
+    :arg song: A song from the search results (Required)
+    :return list: The lines of the song, empty if none were found
+    Gets the page of a song and finds the lyrics on it
+    """
+    session = await get_session()
 
     # Get the returned html
-    r = requests.get(lyrics_url)
-
-    # Create a soup object with returned html
-    soup = BeautifulSoup(r.content, features='lxml')
-
-    # Attempt to find div with class lyrics
-    lyrics_div = soup.find_all("div", {"class": "lyrics"})
-
-    # If the div exists, go with the normal method
-    # otherwise go with the alternative option
-    if len(lyrics_div) > 0:
-        # Find the child p element
-        lyrics = lyrics_div[0].find("p")
-
-        # Store the lines with <br/> cleared and separated by \n chars
-        lines = lyrics.text.split("\n")
-    else:
-        # Find the lyrics div
-        lines = []
-        divs = soup.find_all("div",
-                             {"class": "Lyrics__Container-sc-1ynbvzw-6 krDVEH"}
-                             )
-        for div in divs:
-            tag_text = []
-            for child in div.children:
-                tag_text += get_text([child])
-            lines += list(filter(lambda x: x != '', tag_text))
-
-        # Insert \n before square brackets
-        for i in range(len(lines)):
-            if lines[i][0] == "[":
-                lines[i] = "\n"+lines[i]
+    try:
+        async with session.get(song['url']) as response:
+            content = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return []
+
+    # Parse the page off of the event loop, a page that
+    # can't be parsed is treated as having no lyrics
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, parse_lyrics, content)
+    except lxml.etree.ParserError:
+        return []
+
+
+async def get_lyrics(search_term: str, artist: str = None) -> dict:
+    """
+    :arg search_term: The name of the song to find the lyrics for (Required)
+    :arg artist: Artist of song (Optional)
+    :return list: A list containing the lines of the song
+    Searches the genius website to get the lyrics of a song,
+    waiting on the lookup already running for the same search
+    """
+    key = lyricscache.search_key(search_term, artist)
+
+    # Searches without a key can't be matched to others
+    if key is None:
+        return await lookup_lyrics(search_term, artist)
+
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(lookup_lyrics(search_term, artist))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+
+    # Other callers may be waiting on the lookup, so don't cancel it
+    return await asyncio.shield(task)
+
+
+async def prefetch(songs: list) -> None:
+    """
+    :arg songs: The name and artist of each song (Required)
+    :return None:
+    Gets the lyrics of songs ahead of time so they are cached
+    """
+    async def fetch(name, artist):
+        async with _prefetch_slots:
+            await get_lyrics(name, artist)
+
+    await asyncio.gather(*[fetch(name, artist) for name, artist in songs])
+
+
+async def lookup_lyrics(search_term: str, artist: str = None) -> dict:
+    """
+    :arg search_term: The name of the song to find the lyrics for (Required)
+    :arg artist: Artist of song (Optional)
+    :return list: A list containing the lines of the song
+    Gets the lyrics of a song from the cache or the genius website
+    """
+    # Use the lyrics from before if this has been searched already
+    lines = await database.run(lyricscache.get, search_term, artist)
+    if lines is not None:
+        return {"info": lines, "Error": 0}
+
+    candidates = await find_candidates(search_term, artist)
+    if candidates['Error'] != 0:
+        return candidates
+    songs = candidates['info']
+
+    # A different search may have found the best match before
+    lines = await database.run(lyricscache.get_song, songs[0]['id'],
+                               search_term, artist)
+    if lines is not None:
+        return {"info": lines, "Error": 0}
+
+    # Fetch the pages of the best matches at once, using the
+    # best match that has lyrics
+    tasks = [asyncio.ensure_future(fetch_lyrics(song)) for song in songs]
+    try:
+        for song, task in zip(songs, tasks):
+            lines = await task
+            if lines:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if not lines:
+        return {'info': [], 'Error': 'Lyrics not found'}
+
+    # Store the lyrics so the song isn't fetched again
+    await database.run(lyricscache.put, search_term, artist, song['id'],
+                       lines, song.get('title'),
+                       song.get('primary_artist', {}).get('name'))
 
     # Return the results
     return {"info": lines, "Error": 0}
 
 
-def get_text(children: list) -> list:
+async def find_lyric(phrase: str) -> dict:
+    """
+    :arg phrase: Words from the song (Required)
+    :return dict: The title, artist and matching line of each song,
+                  and whether they came from stored lyrics
+    Finds songs containing a phrase in the stored lyrics,
+    asking genius only if no stored song matches
+    """
+    songs = await database.run(lyricscache.find, phrase)
+    if songs:
+        return {"info": {"songs": songs, "stored": True}, "Error": 0}
+
+    # Genius searches lyrics too, but can't say which line matched
+    results = await search(phrase)
+    if results['Error'] != 0:
+        return results
+    if len(results['info']) == 0:
+        return {'info': [], 'Error': "No songs found with that lyric"}
+
+    songs = [[result['result']['title'],
+              result['result']['primary_artist']['name'], None]
+             for result in results['info'][:5]]
+    return {"info": {"songs": songs, "stored": False}, "Error": 0}
+
+
+def parse_lyrics(content: bytes) -> list:
     """
-    :arg child: A child of the div to find the text of
-    :return list: A list of strings
-    Gets all text from a child element
+    :arg content: The html of a song's page (Required)
+    :return list: The lines of the song
+    Finds the lyrics in the html of a song's page
     """
-    text = []
-    for child in children:
-        if isinstance(child, bs4.NavigableString):
-            text.append(child)
-        elif isinstance(child, bs4.Tag):
-            text += get_text(child.children)
+    # Parse the html without building a soup of the whole page
+    tree = lxml.html.fromstring(content)
+
+    # The old layout keeps the lyrics in a single p element
+    old_layout = tree.xpath(OLD_LYRICS_PATH)
+    if len(old_layout) > 0:
+        # Store the lines separated by \n chars
+        return old_layout[0].text_content().split("\n")
+
+    lines = []
+    for div in tree.xpath(LYRICS_PATH):
+        # Each line ends at a line break, text in links
+        # and formatting belongs to the same line
+        for br in div.iter("br"):
+            br.tail = "\n" + (br.tail or "")
+
+        lines += [line for line in div.text_content().split("\n")
+                  if line != '']
 
-    return text
+    # Insert \n before square brackets
+    return ["\n"+line if line[0] == "[" else line for line in lines]
@@ -0,0 +1,323 @@
+# Import standard libraries
+import os
+import re
+import time
+import threading
+import unicodedata
+import collections
+
+# Import 3rd party libraries
+import psycopg2
+
+# Import custom script
+import database
+
+# Number of entries kept in memory
+LYRICS_CACHE_SIZE = int(os.getenv('LYRICS_CACHE_SIZE', '256'))
+
+# Number of songs kept in the Lyrics table
+LYRICS_TABLE_SIZE = int(os.getenv('LYRICS_TABLE_SIZE', '20000'))
+
+# Seconds before stored lyrics are fetched again
+LYRICS_TTL = float(os.getenv('LYRICS_TTL', str(30 * 86400)))
+
+# Parts of titles that don't change which song it is,
+# bracketed text like (feat. x) or [Remastered] and - Live suffixes
+_brackets = re.compile(r"[(\[].*?[)\]]")
+_suffix = re.compile(r"\s-\s.*$")
+_not_word = re.compile(r"[\W_]+")
+
+# Memory cache, key -> [song id, lines, expiry time], least recent first
+_memory = collections.OrderedDict()
+_memory_lock = threading.Lock()
+
+# Counters of where lyrics were found, id hits are searches
+# that missed but found a song that was already stored
+metrics = collections.Counter()
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str, amount: int = 1) -> None:
+    """
+    :arg name: The counter to change (Required)
+    :arg amount: The amount to add (Optional)
+    :return None:
+    Adds to a counter, locked as the database threads share them
+    """
+    with _metrics_lock:
+        metrics[name] += amount
+
+
+def normalize(text: str, strip: bool = True) -> str:
+    """
+    :arg text: A song title or artist (Required)
+    :arg strip: Whether to remove bracketed parts and - suffixes (Optional)
+    :return str: The text in a form that matches other spellings
+    Lower cases the text and strips accents, punctuation
+    and parts that don't identify the song
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(letter for letter in text
+                   if not unicodedata.combining(letter) and ord(letter) != 8203)
+
+    text = text.lower()
+    if strip:
+        text = _suffix.sub("", _brackets.sub("", text))
+    return _not_word.sub(" ", text).strip()
+
+
+def search_key(title: str, artist: str = None) -> str:
+    """
+    :arg title: The title searched for (Required)
+    :arg artist: The artist searched for (Optional)
+    :return str: The key the search is cached under, or None
+    if the search can't be told apart from others
+    Creates the cache key of a search
+    """
+    # Only titles from spotify come with an artist, typed searches
+    # are often "Artist - Song" so nothing can be stripped from them
+    if artist is None:
+        return f"{' '.join(title.lower().split())}|" if title.strip() else None
+
+    # Titles that are only brackets like [Untitled] keep them
+    name = normalize(title) or normalize(title, strip=False)
+    if not name:
+        return None
+    return f"{name}|{normalize(artist)}"
+
+
+def _remember(key: str, song_id: int, lines: list, expiry: float) -> None:
+    """
+    :arg key: The key to store the lyrics under (Required)
+    :arg song_id: The genius id of the song (Required)
+    :arg lines: The lines of the song (Required)
+    :arg expiry: The time the lyrics expire (Required)
+    :return None:
+    Adds lyrics to the memory cache, removing the
+    least recently used entries when full
+    """
+    with _memory_lock:
+        _memory[key] = [song_id, lines, expiry]
+        _memory.move_to_end(key)
+        while len(_memory) > LYRICS_CACHE_SIZE:
+            _memory.popitem(last=False)
+            _count("memory_evictions")
+
+
+def _recall(key: str) -> list:
+    """
+    :arg key: The key to look up (Required)
+    :return list: The song id and lines, or None if not cached
+    Gets lyrics from the memory cache
+    """
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return entry[:2]
+
+
+def _load(statement: str, args: tuple) -> list:
+    """
+    :arg statement: The statement selecting songid, lines and fetched (Required)
+    :arg args: The arguments for the statement (Required)
+    :return list: The song id, lines and expiry, or None if not stored
+    Gets unexpired lyrics from the Lyrics table, marking them as used
+    """
+    # The cache is only a speed up so a database problem is a miss
+    try:
+        row = database.execute(statement, args, fetch="one")
+        if row is None or row[2] + LYRICS_TTL <= time.time():
+            return None
+
+        database.execute("UPDATE Lyrics SET used = %s\nWHERE songid = %s;",
+                         (time.time(), row[0]), commit=True)
+    except psycopg2.Error:
+        _count("table_errors")
+        return None
+
+    return [row[0], list(row[1]), row[2] + LYRICS_TTL]
+
+
+def get(title: str, artist: str = None) -> list:
+    """
+    :arg title: The title searched for (Required)
+    :arg artist: The artist searched for (Optional)
+    :return list: The lines of the song, or None if not cached
+    Gets the lyrics a search found before, from memory then the database
+    """
+    key = search_key(title, artist)
+    if key is None:
+        _count("misses")
+        return None
+
+    entry = _recall(key)
+    if entry is not None:
+        _count("memory_hits")
+        return entry[1]
+
+    statement = "SELECT Lyrics.songid, lines, fetched FROM LyricsKeys\n"\
+                "JOIN Lyrics ON Lyrics.songid = LyricsKeys.songid\n"\
+                "WHERE searchkey = %s;"
+    entry = _load(statement, (key,))
+    if entry is not None:
+        _count("table_hits")
+        _remember(key, *entry)
+        return entry[1]
+
+    _count("misses")
+    return None
+
+
+def get_song(song_id: int, title: str = None, artist: str = None) -> list:
+    """
+    :arg song_id: The genius id of the song (Required)
+    :arg title: The title searched for, to cache the search under (Optional)
+    :arg artist: The artist searched for (Optional)
+    :return list: The lines of the song, or None if not cached
+    Gets the lyrics of a song found by a different search before
+    """
+    key = f"id:{song_id}"
+
+    # The search already counted as a miss, so only count hits
+    entry = _recall(key)
+    if entry is None:
+        statement = "SELECT songid, lines, fetched FROM Lyrics\n"\
+                    "WHERE songid = %s;"
+        entry = _load(statement, (song_id,))
+        if entry is None:
+            return None
+        _remember(key, *entry)
+    _count("id_hits")
+
+    # Let the search find the song straight away next time
+    key = search_key(title, artist) if title is not None else None
+    if key is not None:
+        _link(key, song_id, entry[1])
+
+    return entry[1]
+
+
+def _link(key: str, song_id: int, lines: list) -> None:
+    """
+    :arg key: The search key (Required)
+    :arg song_id: The genius id of the song (Required)
+    :arg lines: The lines of the song (Required)
+    :return None:
+    Points a search at an already stored song
+    """
+    _remember(key, song_id, lines, time.time() + LYRICS_TTL)
+
+    try:
+        database.execute("INSERT INTO LyricsKeys\nVALUES (%s, %s)\n"
+                         "ON CONFLICT (searchkey)\n"
+                         "DO UPDATE SET songid = EXCLUDED.songid;",
+                         (key, song_id), commit=True)
+    except psycopg2.Error:
+        _count("table_errors")
+
+
+def put(title: str, artist: str, song_id: int, lines: list,
+        song_title: str = None, song_artist: str = None) -> None:
+    """
+    :arg title: The title searched for (Required)
+    :arg artist: The artist searched for, can be None (Required)
+    :arg song_id: The genius id of the song (Required)
+    :arg lines: The lines of the song (Required)
+    :arg song_title: The title of the song on genius (Optional)
+    :arg song_artist: The artist of the song on genius (Optional)
+    :return None:
+    Stores fetched lyrics in memory and in the database,
+    removing the least recently used songs when the table is full
+    """
+    key = search_key(title, artist)
+    if key is None:
+        return
+    now = time.time()
+
+    # Plain strings, so parsed pages aren't kept alive by the cache
+    lines = [str(line) for line in lines]
+
+    _remember(key, song_id, lines, now + LYRICS_TTL)
+    _remember(f"id:{song_id}", song_id, lines, now + LYRICS_TTL)
+
+    try:
+        with database.connection() as con:
+            cur = con.cursor()
+            cur.execute("INSERT INTO Lyrics (songid, title, artist, lines,"
+                        " fetched, used, document)\n"
+                        "VALUES (%s, %s, %s, %s, %s, %s,"
+                        " to_tsvector('english', %s))\n"
+                        "ON CONFLICT (songid)\n"
+                        "DO UPDATE SET lines = EXCLUDED.lines,"
+                        " fetched = EXCLUDED.fetched,"
+                        " used = EXCLUDED.used,"
+                        " document = EXCLUDED.document;",
+                        (song_id, song_title, song_artist, lines, now, now,
+                         "\n".join([song_title or ""] + lines)))
+            cur.execute("INSERT INTO LyricsKeys\nVALUES (%s, %s)\n"
+                        "ON CONFLICT (searchkey)\n"
+                        "DO UPDATE SET songid = EXCLUDED.songid;",
+                        (key, song_id))
+
+            # Keys of evicted songs are removed by the foreign key
+            cur.execute("DELETE FROM Lyrics\nWHERE songid IN ("
+                        "SELECT songid FROM Lyrics\n"
+                        "ORDER BY used DESC OFFSET %s);",
+                        (LYRICS_TABLE_SIZE,))
+            _count("table_evictions", cur.rowcount)
+            cur.close()
+            con.commit()
+    except psycopg2.Error:
+        _count("table_errors")
+
+
+def find(phrase: str, limit: int = 5) -> list:
+    """
+    :arg phrase: Words from the song (Required)
+    :arg limit: The most songs to return (Optional)
+    :return list: The title, artist and matching line of each song
+    Searches the stored lyrics for songs containing the phrase,
+    best match first
+    """
+    # Songs with the words in order, then songs with all the words
+    statement = "SELECT title, artist, lines FROM Lyrics,"\
+                " {}('english', %s) query\n"\
+                "WHERE document @@ query\n"\
+                "ORDER BY ts_rank(document, query) DESC LIMIT %s;"
+
+    rows = []
+    for parser in ["phraseto_tsquery", "plainto_tsquery"]:
+        rows = database.execute(statement.format(parser), (phrase, limit),
+                                fetch="all")
+        if rows:
+            break
+
+    words = set(normalize(phrase, strip=False).split())
+    songs = []
+    for title, artist, lines in rows:
+        # Show the line sharing the most words with the phrase
+        line = max(lines, key=lambda line:
+                   len(words & set(normalize(line, strip=False).split())))
+        songs.append([title, artist, line.strip()])
+
+    return songs
+
+
+def stats() -> dict:
+    """
+    :return dict: The cache counters and hit rate
+    Gets a snapshot of how well the cache is working
+    """
+    with _metrics_lock:
+        info = collections.Counter(metrics)
+    lookups = info["memory_hits"] + info["table_hits"] + info["misses"]
+    hits = lookups - info["misses"] + info["id_hits"]
+
+    info["memory_size"] = len(_memory)
+    info["hit_rate"] = hits / lookups if lookups else 0.0
+    return dict(info)
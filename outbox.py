@@ -0,0 +1,210 @@
+# Import standard libraries
+import os
+import io
+import csv
+import time
+import asyncio
+import collections
+
+# Import 3rd party libraries
+import discord
+
+# Import custom script
+import computations
+
+# Discord allows 5 messages every 5 seconds in a channel
+BUCKET_SIZE = 5
+BUCKET_TIME = 5.0
+
+# Longest message discord allows
+MESSAGE_LIMIT = 2000
+
+# Number of messages above which results are sent as a file
+ATTACH_THRESHOLD = int(os.getenv('ATTACH_THRESHOLD', '5'))
+
+# Queue for each channel messages are sent to
+_queues = {}
+
+
+class ChannelQueue:
+    """
+    Sends the messages for a channel in order, joining queued messages
+    together and keeping within the channel's rate limit
+    """
+    def __init__(self, channel):
+        """
+        :arg channel: The channel the messages are sent to (Required)
+        """
+        self.channel = channel
+        self.pending = collections.deque()
+        self.sent = collections.deque()
+        self.worker = None
+
+    def put(self, content: str = None, **extras) -> asyncio.Future:
+        """
+        :arg content: The text of the message (Optional)
+        :arg extras: A file or embed to send with the message (Optional)
+        :return Future: Completed once the message has been sent
+        Adds a message to the queue
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append([content, extras, future])
+
+        # Start sending if nothing is being sent
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.ensure_future(self.run())
+
+        return future
+
+    async def wait_turn(self) -> None:
+        """
+        :return None:
+        Waits until a message can be sent without being rate limited
+        """
+        while True:
+            now = time.monotonic()
+            while self.sent and now - self.sent[0] >= BUCKET_TIME:
+                self.sent.popleft()
+            if len(self.sent) < BUCKET_SIZE:
+                return
+            await asyncio.sleep(BUCKET_TIME - (now - self.sent[0]))
+
+    def next_message(self) -> list:
+        """
+        :return list: The content, extras and futures of the next message
+        Takes the next message from the queue, joining on the
+        messages after it while they fit in one message
+        """
+        content, extras, future = self.pending.popleft()
+        futures = [future]
+
+        # Files and embeds are sent on their own
+        while not extras and self.pending and not self.pending[0][1]:
+            next_content = self.pending[0][0]
+            if len(content) + 1 + len(next_content) > MESSAGE_LIMIT:
+                break
+            content += "\n" + next_content
+            futures.append(self.pending.popleft()[2])
+
+        return [content, extras, futures]
+
+    async def run(self) -> None:
+        """
+        :return None:
+        Sends every message in the queue
+        """
+        while self.pending:
+            await self.wait_turn()
+            content, extras, futures = self.next_message()
+
+            try:
+                message = await self.channel.send(content, **extras)
+            except Exception as error:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(message)
+
+            self.sent.append(time.monotonic())
+
+        # Forget the queue once its sends no longer count
+        # towards the rate limit, unless it is used again
+        asyncio.get_running_loop().call_later(BUCKET_TIME, self.prune)
+
+    def prune(self) -> None:
+        """
+        :return None:
+        Removes the queue if it has nothing left to send
+        """
+        if self.pending or (self.worker is not None
+                            and not self.worker.done()):
+            return
+        if _queues.get(self.channel.id) is self:
+            del _queues[self.channel.id]
+
+
+async def get_queue(place) -> ChannelQueue:
+    """
+    :arg place: ctx, a channel or a user to send to (Required)
+    :return ChannelQueue: The queue for the channel
+    Gets the queue for a channel, creating it if needed,
+    messages to a user go through their dm channel
+    """
+    if isinstance(place, (discord.User, discord.Member)):
+        channel = place.dm_channel or await place.create_dm()
+    else:
+        channel = getattr(place, 'channel', place)
+
+    if channel.id not in _queues:
+        _queues[channel.id] = ChannelQueue(channel)
+    return _queues[channel.id]
+
+
+async def send(place, content: str = None, **extras) -> discord.Message:
+    """
+    :arg place: ctx or a user, where the message is sent (Required)
+    :arg content: The text of the message (Optional)
+    :arg extras: A file or embed to send with the message (Optional)
+    :return Message: The message the text was sent in
+    Sends a message through the channel's queue
+    """
+    queue = await get_queue(place)
+    return await queue.put(content, **extras)
+
+
+async def edit(message: discord.Message,
+               content: str) -> discord.Message:
+    """
+    :arg message: The message to change (Required)
+    :arg content: The new text of the message (Required)
+    :return Message: The edited message
+    Edits a message once the channel's rate limit allows it
+    """
+    queue = await get_queue(message.channel)
+    await queue.wait_turn()
+    queue.sent.append(time.monotonic())
+
+    # Forget the queue later if nothing else uses it
+    asyncio.get_running_loop().call_later(BUCKET_TIME, queue.prune)
+    return await message.edit(content=content)
+
+
+async def send_lines(place, lines: list, header: str = None,
+                     rows: list = None, filename: str = "results") -> None:
+    """
+    :arg place: ctx or a user, where the messages are sent (Required)
+    :arg lines: The lines to send (Required)
+    :arg header: A message to send before the lines (Optional)
+    :arg rows: The data behind the lines, used for a csv file (Optional)
+    :arg filename: The name of the file without an extension (Optional)
+    :return None:
+    Sends lines as inline code messages, or as a single file
+    if they would take too many messages
+    """
+    queue = await get_queue(place)
+    messages = computations.form_message(list(lines))
+
+    futures = []
+    if header is not None:
+        futures.append(queue.put(header))
+
+    if len(messages) > ATTACH_THRESHOLD:
+        # Send the results as a csv if there is data, otherwise as text
+        data = io.StringIO()
+        if rows is not None:
+            csv.writer(data).writerows(rows)
+            filename += ".csv"
+        else:
+            data.write("\n".join(lines))
+            filename += ".txt"
+
+        file = discord.File(io.BytesIO(data.getvalue().encode()), filename)
+        futures.append(queue.put(f"{len(lines)} results attached",
+                                 file=file))
+    else:
+        futures += [queue.put(message) for message in messages]
+
+    await asyncio.gather(*futures)
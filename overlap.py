@@ -0,0 +1,84 @@
+# Import 3rd party libraries
+import numpy
+
+
+class IdInterner:
+    """
+    Gives every spotify id a small dense integer
+    so that sets of ids can be used as array indexes
+    """
+    def __init__(self):
+        self.indexes = {}
+        self.ids = []
+
+    def intern(self, song_id: str) -> int:
+        """
+        :arg song_id: The id to intern (Required)
+        :return int: The integer for the id
+        Gets the integer for an id, giving it a new one if unseen
+        """
+        index = self.indexes.get(song_id)
+        if index is None:
+            index = len(self.ids)
+            self.indexes[song_id] = index
+            self.ids.append(song_id)
+        return index
+
+
+def intersect(song_sets: list) -> list:
+    """
+    :arg song_sets: The collections of song ids to intersect (Required)
+    :return list: The ids in every collection
+    Finds the ids shared by every collection, starting with the
+    smallest collection so the working set is as small as it can be
+    """
+    if not song_sets:
+        return []
+
+    ordered = sorted(song_sets, key=len)
+
+    # Only ids of the smallest collection can be in the result
+    return list(set(ordered[0]).intersection(*ordered[1:]))
+
+
+def pairwise_similarity(song_sets: list) -> list:
+    """
+    :arg song_sets: The collections of song ids to compare (Required)
+    :return list: The two indexes, jaccard similarity and shared
+    songs of each pair, most similar first
+    Compares every pair of collections at once with a matrix product
+    """
+    interner = IdInterner()
+    columns = [numpy.fromiter((interner.intern(song) for song in song_ids),
+                              dtype=numpy.int64, count=len(song_ids))
+               for song_ids in song_sets]
+    sizes = numpy.array([len(song_ids) for song_ids in song_sets],
+                        dtype=numpy.float64)
+
+    # Songs only one collection has can't be shared, so leave them out
+    counts = numpy.bincount(numpy.concatenate(columns),
+                            minlength=len(interner.ids))
+    shared_songs = counts >= 2
+    new_columns = numpy.cumsum(shared_songs) - 1
+
+    membership = numpy.zeros((len(song_sets), int(shared_songs.sum())),
+                             dtype=numpy.float32)
+    for row, song_columns in enumerate(columns):
+        song_columns = song_columns[shared_songs[song_columns]]
+        membership[row, new_columns[song_columns]] = 1
+
+    # Number of songs each pair shares
+    shared = membership @ membership.T
+
+    # Jaccard similarity of each pair
+    union = sizes[:, None] + sizes[None, :] - shared
+    jaccard = shared / numpy.maximum(union, 1)
+
+    # Order every pair from most to least similar
+    first, second = numpy.triu_indices(len(song_sets), 1)
+    order = numpy.argsort(-jaccard[first, second], kind='stable')
+
+    return [[int(first[i]), int(second[i]),
+             float(jaccard[first[i], second[i]]),
+             int(shared[first[i], second[i]])]
+            for i in order.tolist()]
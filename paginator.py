@@ -0,0 +1,163 @@
+# Import standard libraries
+import os
+import asyncio
+
+# Import 3rd party libraries
+import discord
+
+# Import custom script
+import outbox
+
+# Number of lines shown on each page
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '20'))
+
+# Seconds without a reaction before the pages stop changing
+PAGE_TIMEOUT = float(os.getenv('PAGE_TIMEOUT', '300'))
+
+# Longest description an embed can have
+DESCRIPTION_LIMIT = 2048
+
+# Reactions used to change page
+FIRST = "\N{BLACK LEFT-POINTING DOUBLE TRIANGLE}"
+PREVIOUS = "\N{BLACK LEFT-POINTING TRIANGLE}"
+NEXT = "\N{BLACK RIGHT-POINTING TRIANGLE}"
+LAST = "\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE}"
+CONTROLS = (FIRST, PREVIOUS, NEXT, LAST)
+
+# Listeners waiting for reactions
+_listeners = set()
+
+
+class Paginator:
+    """
+    Holds a long result and shows it one page at a time in an
+    embed, only formatting the page being looked at
+    """
+    def __init__(self, entries: list, pattern: str = None,
+                 title: str = None, page_size: int = PAGE_SIZE):
+        """
+        :arg entries: The items to show (Required)
+        :arg pattern: The pattern of how each item is formed,
+                      items are shown as they are if not given (Optional)
+        :arg title: The title of the embed (Optional)
+        :arg page_size: The number of items on each page (Optional)
+        """
+        self.entries = entries
+        self.pattern = pattern
+        self.title = title
+        self.page_size = page_size
+        self.page = 0
+
+    @property
+    def pages(self) -> int:
+        """
+        :return int: The number of pages
+        """
+        return max(1, -(-len(self.entries) // self.page_size))
+
+    def render(self, page: int) -> discord.Embed:
+        """
+        :arg page: The index of the page to show (Required)
+        :return Embed: The embed showing the page
+        Formats only the items on a page into an embed
+        """
+        start = page * self.page_size
+        items = self.entries[start:start+self.page_size]
+
+        if self.pattern is not None:
+            lines = [self.pattern.format(*item) for item in items]
+        else:
+            lines = [str(item) for item in items]
+
+        description = "\n".join(lines)
+        if len(description) > DESCRIPTION_LIMIT:
+            description = description[:DESCRIPTION_LIMIT-4] + " ..."
+
+        embed = discord.Embed(title=self.title, description=description)
+        embed.set_footer(text=f"Page {page+1}/{self.pages}")
+        return embed
+
+    def turn(self, emoji: str) -> bool:
+        """
+        :arg emoji: The reaction the user added (Required)
+        :return bool: Whether the page changed
+        Moves to the page the reaction asks for
+        """
+        targets = {FIRST: 0, PREVIOUS: self.page - 1,
+                   NEXT: self.page + 1, LAST: self.pages - 1}
+        page = min(max(targets[emoji], 0), self.pages - 1)
+
+        changed = page != self.page
+        self.page = page
+        return changed
+
+    async def start(self, ctx: discord.ext.commands.Context) -> None:
+        """
+        :arg ctx: discord context class for current event (Required)
+        :return None:
+        Sends the first page and lets the command's author
+        change page with reactions
+        """
+        message = await outbox.send(ctx, embed=self.render(0))
+
+        # Nothing to change if everything fits on one page
+        if self.pages == 1:
+            return
+
+        for emoji in CONTROLS:
+            await message.add_reaction(emoji)
+
+        # Let the command finish while the pages stay usable, keeping
+        # the listener so it isn't garbage collected while waiting
+        listener = asyncio.ensure_future(self.listen(ctx, message))
+        _listeners.add(listener)
+        listener.add_done_callback(_listeners.discard)
+
+    async def listen(self, ctx: discord.ext.commands.Context,
+                     message: discord.Message) -> None:
+        """
+        :arg ctx: discord context class for current event (Required)
+        :arg message: The message showing the pages (Required)
+        :return None:
+        Changes page whenever the author reacts, until they stop reacting
+        """
+        def check(reaction, user):
+            return (user == ctx.author and
+                    reaction.message.id == message.id and
+                    str(reaction.emoji) in CONTROLS)
+
+        while True:
+            try:
+                reaction, user = await ctx.bot.wait_for(
+                    'reaction_add', timeout=PAGE_TIMEOUT, check=check)
+            except asyncio.TimeoutError:
+                break
+
+            if self.turn(str(reaction.emoji)):
+                await message.edit(embed=self.render(self.page))
+
+            # Remove the reaction so it can be used again,
+            # not possible in dms or without permission
+            try:
+                await message.remove_reaction(reaction.emoji, user)
+            except (discord.Forbidden, discord.HTTPException):
+                pass
+
+        # Show the pages can no longer be changed
+        try:
+            await message.clear_reactions()
+        except (discord.Forbidden, discord.HTTPException):
+            pass
+
+
+async def paginate(ctx: discord.ext.commands.Context, entries: list,
+                   pattern: str = None, title: str = None) -> None:
+    """
+    :arg ctx: discord context class for current event (Required)
+    :arg entries: The items to show (Required)
+    :arg pattern: The pattern of how each item is formed (Optional)
+    :arg title: The title of the embed (Optional)
+    :return None:
+    Shows a long result as pages the user can react to change
+    """
+    await Paginator(entries, pattern, title).start(ctx)
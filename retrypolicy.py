@@ -0,0 +1,147 @@
+# Import standard libraries
+import time
+import random
+import asyncio
+import collections
+
+# Import 3rd party libraries
+import aiohttp
+
+# Statuses in spotify error responses that won't change if retried
+FATAL_STATUSES = (400, 401, 403, 404)
+
+# Errors raised by requests which are worth retrying
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# Counters of attempts, retries and give ups for each endpoint
+metrics = {"attempts": collections.Counter(),
+           "retries": collections.Counter(),
+           "give_ups": collections.Counter()}
+
+
+class RetryPolicy:
+    """
+    Decides how often and how long to wait between
+    attempts of a request
+    """
+    def __init__(self, attempts: int = 5, base_delay: float = 0.5,
+                 max_delay: float = 8.0, deadline: float = 30.0):
+        """
+        :arg attempts: The most attempts to make (Optional)
+        :arg base_delay: The delay before the first retry (Optional)
+        :arg max_delay: The longest delay between attempts (Optional)
+        :arg deadline: Seconds after which no more attempts are made (Optional)
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delay(self, attempt: int) -> float:
+        """
+        :arg attempt: The number of attempts made so far (Required)
+        :return float: Seconds to wait before the next attempt
+        Gets an exponential backoff with full jitter
+        """
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** (attempt - 1)))
+
+    async def run(self, name: str, func, *args, check=None):
+        """
+        :arg name: The name of the endpoint, for the counters (Required)
+        :arg func: The coroutine function making the request (Required)
+        :arg args: The arguments to pass to the function (Optional)
+        :arg check: A key the response needs, or a function
+                    returning whether the response worked (Optional)
+        :return: The response, or None if every attempt failed
+        Makes a request, retrying failed attempts with backoff
+        """
+        end = time.monotonic() + self.deadline
+
+        for attempt in range(1, self.attempts + 1):
+            metrics["attempts"][name] += 1
+            wait = self.delay(attempt)
+
+            try:
+                response = await func(*args)
+            except RETRYABLE_ERRORS:
+                response = None
+            else:
+                if succeeded(response, check):
+                    return response
+
+                # Don't waste requests on errors that won't go away
+                if fatal(response):
+                    break
+
+                # Wait as long as spotify asked if it rate limited us
+                if isinstance(response, dict) and 'time_out' in response:
+                    wait = max(wait, response['time_out'])
+
+            # Stop if there isn't time for another attempt
+            if attempt == self.attempts or time.monotonic() + wait > end:
+                break
+
+            metrics["retries"][name] += 1
+            await asyncio.sleep(wait)
+
+        metrics["give_ups"][name] += 1
+        return None
+
+
+def succeeded(response, check) -> bool:
+    """
+    :arg response: The response of a request (Required)
+    :arg check: A key the response needs, or a function
+                returning whether the response worked (Required)
+    :return bool: Whether the request worked
+    Checks whether a response is a successful one
+    """
+    if check is None:
+        return response is not None
+    if callable(check):
+        return check(response)
+    return isinstance(response, dict) and check in response
+
+
+def fatal(response) -> bool:
+    """
+    :arg response: The response of a request (Required)
+    :return bool: Whether retrying is pointless
+    Checks whether a response is an error that retrying won't fix
+    """
+    if not isinstance(response, dict):
+        return False
+
+    error = response.get('error')
+    return isinstance(error, dict) and error.get('status') in FATAL_STATUSES
+
+
+# Policy for endpoints without their own policy
+default = RetryPolicy()
+
+# Policies for endpoints that need different behaviour
+policies = {
+    # Playback changes are noticed by the user so give up quickly
+    "add_track_playback": RetryPolicy(attempts=3, max_delay=2.0,
+                                      deadline=10.0),
+    "pause_playback": RetryPolicy(attempts=3, max_delay=2.0, deadline=10.0),
+    # Creating a playlist twice leaves a duplicate behind
+    "create_playlist": RetryPolicy(attempts=2),
+    # Playlist pages are fetched in bulk and can wait longer
+    "get_tracks_playlist": RetryPolicy(attempts=6, deadline=120.0),
+}
+
+
+async def call(name: str, func, *args, check=None):
+    """
+    :arg name: The name of the endpoint (Required)
+    :arg func: The coroutine function making the request (Required)
+    :arg args: The arguments to pass to the function (Optional)
+    :arg check: A key the response needs, or a function
+                returning whether the response worked (Optional)
+    :return: The response, or None if every attempt failed
+    Makes a request with the policy for the endpoint
+    """
+    policy = policies.get(name, default)
+    return await policy.run(name, func, *args, check=check)
@@ -0,0 +1,181 @@
+# Import standard libraries
+import os
+import time
+import random
+import asyncio
+import datetime
+
+# Import 3rd party libraries
+import psycopg2
+
+# Import custom script
+import database
+
+# Day (0 is Monday) and hour the weekly jobs run at
+RUN_WEEKDAY = int(os.getenv('SCHEDULE_WEEKDAY', '6'))
+RUN_HOUR = int(os.getenv('SCHEDULE_HOUR', '14'))
+
+# Seconds users are spread over so they aren't all updated at once
+SPREAD = float(os.getenv('SCHEDULE_SPREAD', '3600'))
+
+# Longest time in seconds between checks for a due job
+CHECK_INTERVAL = float(os.getenv('SCHEDULE_CHECK_INTERVAL', '300'))
+
+# Extra seconds a claim lasts past the spread before another
+# process can assume the run crashed and take it over
+LEASE_MARGIN = float(os.getenv('SCHEDULE_LEASE_MARGIN', '1800'))
+
+# Loop running for each job, so a job is never looped twice
+_loops = {}
+
+
+def next_weekly(after: float) -> float:
+    """
+    :arg after: The timestamp the run has to be after (Required)
+    :return float: The timestamp of the next weekly run
+    Finds the next RUN_WEEKDAY at RUN_HOUR after a time
+    """
+    date = datetime.datetime.fromtimestamp(after)
+    aim = date.replace(hour=RUN_HOUR, minute=0, second=0, microsecond=0)
+    aim += datetime.timedelta(days=(RUN_WEEKDAY - date.weekday()) % 7)
+
+    if aim.timestamp() <= after:
+        aim += datetime.timedelta(days=7)
+
+    return aim.timestamp()
+
+
+def add_job(name: str, first_run: float) -> None:
+    """
+    :arg name: The name of the job (Required)
+    :arg first_run: The timestamp of the job's first run (Required)
+    :return None:
+    Adds a job to the Schedules table if it isn't there already,
+    keeping the times of an existing job
+    """
+    statement = "INSERT INTO Schedules (name, nextrun)\nVALUES (%s, %s)\n"\
+                "ON CONFLICT (name) DO NOTHING;"
+    database.execute(statement, (name, first_run), commit=True)
+
+
+def next_run(name: str) -> float:
+    """
+    :arg name: The name of the job (Required)
+    :return float: The timestamp the job is next due
+    Gets when a job next needs to run
+    """
+    statement = "SELECT nextrun FROM Schedules\nWHERE name = %s;"
+    return database.execute(statement, (name,), fetch="one")[0]
+
+
+def claim(name: str, lease: float) -> bool:
+    """
+    :arg name: The name of the job (Required)
+    :arg lease: Seconds the claim lasts (Required)
+    :return bool: Whether this process should run the job
+    Claims a due job in a single statement so only one
+    process or loop can run it, taking over expired claims
+    """
+    now = time.time()
+    statement = "UPDATE Schedules SET claimeduntil = %s\n"\
+                "WHERE name = %s AND nextrun <= %s\n"\
+                "AND (claimeduntil IS NULL OR claimeduntil < %s)\n"\
+                "RETURNING name;"
+    row = database.execute(statement, (now + lease, name, now, now),
+                           fetch="one", commit=True)
+    return row is not None
+
+
+def finish(name: str, started: float) -> None:
+    """
+    :arg name: The name of the job (Required)
+    :arg started: The timestamp the run started (Required)
+    :return None:
+    Records a finished run and schedules the next one,
+    missed weeks are caught up by this run rather than repeated
+    """
+    statement = "UPDATE Schedules SET lastrun = %s, nextrun = %s,"\
+                " claimeduntil = NULL\nWHERE name = %s;"
+    database.execute(statement, (started, next_weekly(time.time()), name),
+                     commit=True)
+
+
+async def spread(users: list, job, window: float = SPREAD) -> list:
+    """
+    :arg users: The users to run the job for (Required)
+    :arg job: The coroutine function to run for each user (Required)
+    :arg window: Seconds to spread the users over (Optional)
+    :return list: The result of the job for each user
+    Runs a job for every user at a random time in the window
+    """
+    async def run_later(user):
+        await asyncio.sleep(random.uniform(0, window))
+        return await job(user)
+
+    return await asyncio.gather(*[run_later(user) for user in users],
+                                return_exceptions=True)
+
+
+async def run_weekly(name: str, job) -> None:
+    """
+    :arg name: The name of the job (Required)
+    :arg job: The coroutine function to run each week (Required)
+    :return None:
+    Runs a job once a week, remembering when it last ran
+    in the database so restarts don't delay or repeat it
+    """
+    # Keep trying to add the job until the database is reachable
+    while True:
+        try:
+            await database.run(add_job, name, next_weekly(time.time()))
+            break
+        except psycopg2.Error as error:
+            print(f"Job {name} database error: {error!r}")
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    while True:
+        started = time.time()
+        try:
+            claimed = await database.run(claim, name, SPREAD + LEASE_MARGIN)
+        except psycopg2.Error as error:
+            # Try to claim again later rather than stopping the loop
+            print(f"Job {name} database error: {error!r}")
+            claimed = False
+
+        if claimed:
+            try:
+                await job()
+            except Exception as error:
+                # Leave the claim to expire so the run is tried again
+                print(f"Job {name} failed: {error!r}")
+            else:
+                try:
+                    await database.run(finish, name, started)
+                except psycopg2.Error as error:
+                    # The claim expires and the run is tried again
+                    print(f"Job {name} database error: {error!r}")
+
+        # Wake up when the job is due, checking regularly in case
+        # another process ran it or its claim expired
+        try:
+            wait = await database.run(next_run, name) - time.time()
+        except psycopg2.Error as error:
+            print(f"Job {name} database error: {error!r}")
+            wait = CHECK_INTERVAL
+        if wait <= 0:
+            wait = CHECK_INTERVAL
+        await asyncio.sleep(min(wait, CHECK_INTERVAL))
+
+
+def start(name: str, job) -> None:
+    """
+    :arg name: The name of the job (Required)
+    :arg job: The coroutine function to run each week (Required)
+    :return None:
+    Starts the weekly loop of a job unless it is already running
+    """
+    loop = _loops.get(name)
+    if loop is not None and not loop.done():
+        return
+
+    _loops[name] = asyncio.ensure_future(run_weekly(name, job))
@@ -0,0 +1,93 @@
+# Import standard libraries
+import hashlib
+import functools
+
+# Import 3rd party libraries
+import numpy
+
+# Number of hashes kept in a sketch, libraries this size
+# or smaller are kept whole and compared exactly
+SKETCH_SIZE = 8192
+
+# Version of the sketch format, stored with each sketch so
+# sketches made by older versions are made again
+VERSION = 2
+
+# Largest value a hash can take
+MAX_HASH = numpy.iinfo(numpy.uint64).max
+
+# Number of standard errors in the margin of an estimate, about 95%
+MARGIN_ERRORS = 1.96
+
+
+def hash_ids(song_ids) -> numpy.ndarray:
+    """
+    :arg song_ids: The ids to hash (Required)
+    :return ndarray: A 64 bit hash of each id
+    Hashes each id to a stable 64 bit number
+    """
+    digests = b"".join(hashlib.blake2b(song_id.encode(), digest_size=8).digest()
+                       for song_id in song_ids)
+    return numpy.frombuffer(digests, dtype="<u8").astype(numpy.uint64)
+
+
+def signature(song_ids) -> numpy.ndarray:
+    """
+    :arg song_ids: The ids to create a signature for (Required)
+    :return ndarray: The smallest hashes of the ids, sorted
+    Creates a bottom-k sketch, the SKETCH_SIZE smallest hashes of the ids.
+    Every sketch uses the same hash, so below the largest hash any
+    sketch keeps, sketches hold exactly the ids of the library
+    """
+    hashes = numpy.unique(hash_ids(song_ids))
+    if len(hashes) > SKETCH_SIZE:
+        hashes = hashes[:SKETCH_SIZE]
+    return hashes
+
+
+def to_bytes(sig: numpy.ndarray) -> bytes:
+    """
+    :arg sig: The signature to convert (Required)
+    :return bytes: The signature for storing
+    Converts a signature to bytes
+    """
+    return sig.astype("<u8").tobytes()
+
+
+def from_bytes(data: bytes) -> numpy.ndarray:
+    """
+    :arg data: The stored signature (Required)
+    :return ndarray: The signature
+    Converts stored bytes back to a signature
+    """
+    return numpy.frombuffer(bytes(data), dtype="<u8").astype(numpy.uint64)
+
+
+def estimate(signatures: list, sizes: list) -> list[float, float, float]:
+    """
+    :arg signatures: The signatures of the sets to compare (Required)
+    :arg sizes: The number of ids in each set (Required)
+    :return list: The estimated number of shared ids, the estimated
+    number of ids in total and the margin of error of the shared ids
+    Estimates how many ids every set shares from their signatures
+    """
+    # Below the smallest cut off of the sketches every sketch is
+    # complete, a sketch smaller than SKETCH_SIZE is the whole set
+    threshold = min(sig[-1] if len(sig) >= SKETCH_SIZE else MAX_HASH
+                    for sig in signatures)
+    samples = [sig[sig <= threshold] for sig in signatures]
+
+    # Share of each set that is in the samples, using the known sizes
+    sampled = sum(len(sample) for sample in samples)
+    if sampled == 0:
+        return [0.0, 0.0, 0.0]
+    rate = min(sampled / max(sum(sizes), 1), 1.0)
+
+    shared = len(functools.reduce(numpy.intersect1d, samples))
+    union = len(functools.reduce(numpy.union1d, samples))
+
+    # Each shared id is sampled with the same chance,
+    # so the sampled count is binomial
+    margin = MARGIN_ERRORS * (max(shared, 1) * (1 - rate)) ** 0.5 / rate
+
+    return [shared / rate, union / rate, margin]
@@ -1,25 +1,26 @@
 # Import standard libraries
 import os
 import asyncio
+import functools
 import math
-import concurrent.futures
-import collections
 
 # Import 3rd party libraries
 from discord.ext import commands
 
 # Import custom script
 import spotifyapi
+import spotifyclient
+import retrypolicy
+import trackinfo
+import analytics
 import computations
+import database
 
 # Get information for spotify OAuth operations
 client_id = os.getenv('SPOTIFY_ID')
 client_secret = os.getenv('SPOTIFY_SECRET')
 redirect_uri = "http://localhost:8080/"
 
-# Constant for retry amounts
-RETRY_AMOUNT = 5
-
 # TODO Add more comments
 
 
@@ -52,8 +53,10 @@ async def setup_user(ctx: commands.Context, bot: commands.Bot, scope: str) -> di
     # Get the auth_code from the url
     auth_code = response.content.split("?code=")[1]
 
-    # Get the response from the spotify api
-    response = oauth.grab_token(auth_code)
+    # Get the response from the spotify api, in a thread
+    # as the request would block the event loop
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(None, oauth.grab_token, auth_code)
 
     if "access_token" not in response:
         return {"info": [], "Error": "Request failed, try again"}
@@ -61,6 +64,41 @@ async def setup_user(ctx: commands.Context, bot: commands.Bot, scope: str) -> di
     return {"info": response, "Error": 0}
 
 
+async def get_code(user: str, scope: str = None) -> str:
+    """
+    :arg user: The id of the user to get the code for (Required)
+    :arg scope: The scope the code needs (Optional)
+    :return str: The auth code for the user
+    Gets an auth code for the user, refreshing it if needed,
+    without blocking the event loop on spotify or the database
+    """
+    kwargs = {"save_func": computations.save_user,
+              "read_func": computations.get_user,
+              "update_func": computations.update_user,
+              "check_func": computations.check_user_exist}
+
+    # Only pass the scope when one is needed
+    if scope:
+        kwargs["scope"] = scope
+
+    # Refreshing makes a request to spotify, so run it in the default
+    # threads rather than taking one meant for queries
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(spotifyapi.init, redirect_uri,
+                                                              user, **kwargs))
+
+
+async def get_playlists_page(sp: spotifyclient.SpotifyClient, offset: int) -> dict:
+    """
+    :arg sp: Instance of the spotify api class to make requests to (Required)
+    :arg offset: The index of the first playlist to get (Required)
+    :return dict: The page of playlists, or None if the request failed
+    Gets a page of 50 of the user's playlists
+    """
+    return await retrypolicy.call("get_users_playlists", sp.get_users_playlists,
+                                  50, offset, check='items')
+
+
 def get_url(scope: str) -> list[str, object]:
     """
     :arg scope: The scope to authorise for (Required)
@@ -77,73 +115,96 @@ def get_url(scope: str) -> list[str, object]:
     return [url, oauth]
 
 
-async def get_user_songs(user: str) -> dict:
+async def sync_library(user: str, progress=None) -> dict:
     """
-    :arg user: The id of the user to save the songs for (Required)
-    :return dict: A dict containing the information about the songs
-    Sets up the users cache and saves all the
-    unique songs in their playlists
+    :arg user: The id of the user to sync the library of (Required)
+    :arg progress: Function called with the number of tracks
+                   in each page as it is fetched (Optional)
+    :return dict: Whether the sync worked or not
+    Updates the stored library of the user with any playlists
+    that have changed, along with the song index and sketch
     """
     scope = 'playlist-read-private'
 
-    if computations.check_user(user, scope):
+    if await computations.check_user_async(user, scope):
         return {"info": [],
                 "Error": "```User has wrong scope\n"
                          "re-authenticate using the `+setup all` command please```"}
 
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, scope=scope, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    code = await get_code(user, scope)
 
-    # Initiate the APIReq class to interact with the api
-    sp = spotifyapi.APIReq(code)
+    # Initiate the client to interact with the api
+    sp = spotifyclient.SpotifyClient(code)
 
-    # Get the total number of playlists the user has
-    response = sp.get_users_playlists(0)
+    # Get the first page of playlists, which also holds the total
+    response = await get_playlists_page(sp, 0)
+    if response is None:
+        return {'info': [], 'Error': "Max retries attempted, request failed"}
+    total = response['total']
+    playlists = response['items']
 
-    retries = RETRY_AMOUNT
-    while 'total' not in response:
-        response = sp.get_users_playlists(0)
-        retries -= 1
-        if retries == 0:
+    # Get every other page of playlists from the api at once
+    pages = await asyncio.gather(*[get_playlists_page(sp, i*50)
+                                   for i in range(1, math.ceil(total/50))])
+    for page in pages:
+        if page is None:
             return {'info': [], 'Error': "Max retries attempted, request failed"}
-    total = response['total']
+        playlists += page['items']
 
-    # Get every playlist from the api
-    playlists = []
-    for i in range(math.ceil(total/50)):
-        playlists_info = sp.get_users_playlists(50, i*50)
+    # Get the snapshots of the playlists already stored
+    stored = await database.run(computations.get_playlist_snapshots, user)
 
-        retries = RETRY_AMOUNT
-        while 'items' not in playlists_info:
-            playlists_info = sp.get_users_playlists(50, i * 50)
-            retries -= 1
-            if retries == 0:
-                return {'info': [], 'Error': "Max retries attempted, request failed"}
-        playlists += playlists_info['items']
+    # Only fetch the playlists which have changed since they were stored
+    changed = [playlist for playlist in playlists
+               if stored.get(playlist['id']) != playlist['snapshot_id']]
 
-    # Get the playlist ids and the number of tracks
-    # in each playlist
-    playlist_ids = map(lambda x: x['id'], playlists)
+    # Fetch the changed playlists at once, keeping them in order
+    results = await asyncio.gather(*[collect_songs(user, playlist['id'], sp, progress)
+                                     for playlist in changed])
 
-    # Define tracks list
-    tracks = []
+    for playlist, songs in zip(changed, results):
+        if songs['Error'] != 0:
+            return songs
 
-    for play_id in playlist_ids:
-        play_tracks = await get_playlist_songs(user, play_id, True, sp)
-        if play_tracks['Error'] != 0:
-            return play_tracks
-        tracks += play_tracks['info']
+        await database.run(computations.save_playlist, user, playlist['id'],
+                           playlist['snapshot_id'], songs['info'])
 
-    # Get all the songs ids and get all the unique songs
-    track_ids = [x['track']['id'] for x in tracks if x['track'] is not None and not x['track']['is_local']]
-    track_dict = [[x['track']['name'], x['track']['artists'][0]['name']] for x in tracks
-                  if x['track'] is not None and not x['track']['is_local']]
+    # Remove playlists the user no longer has
+    removed = set(stored) - {playlist['id'] for playlist in playlists}
+    if removed:
+        await database.run(computations.remove_playlists, user, list(removed))
 
-    songs = dict(zip(track_ids, track_dict))
+    # Keep the song index and sketch up to date with the library
+    if changed or removed or not await database.run(computations.check_indexed, user):
+        await database.run(computations.index_library, user)
 
-    return {"info": songs, "Error": 0}
+    return {"info": "Library synced", "Error": 0}
+
+
+async def collect_songs(user: str, playlist_id: str, sp: spotifyclient.SpotifyClient, progress=None) -> dict:
+    """
+    :arg user: The user to authenticate (Required)
+    :arg playlist_id: The id of the playlist to get songs for (Required)
+    :arg sp: An instance of the spotify api client for use (Required)
+    :arg progress: Function called with the number of tracks
+                   in each page as it is fetched (Optional)
+    :return dict: A dict of song id to the name and artist of the song
+    Gets the unique songs in a playlist, adding each page as it arrives
+    """
+    songs = {}
+    async for page in iter_playlist_songs(user, playlist_id, True, sp):
+        if page['Error'] != 0:
+            return {'info': [], 'Error': page['Error']}
+
+        for track in page['info']:
+            if not track.is_local:
+                songs[track.id] = [track.name, track.artist]
+
+        if progress is not None:
+            progress(len(page['info']))
+
+    return {'info': songs, 'Error': 0}
 
 
 async def sleep_timer(user: str, time: int) -> dict:
@@ -156,29 +217,22 @@ async def sleep_timer(user: str, time: int) -> dict:
     # Set the scope needed for this function
     scope = "user-modify-playback-state user-read-playback-state"
 
-    if computations.check_user(user, scope):
+    if await computations.check_user_async(user, scope):
         return {"info": [], "Error": "Error user not authenticated for use, use `+setup all` command"}
 
     # Wait for the sleep timer time
     await asyncio.sleep(time)
 
-    # Get the auth code and APIReq class to interact with the API
-    code = spotifyapi.init(redirect_uri, user, scope=scope, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    # Get the auth code and client to interact with the API
+    code = await get_code(user, scope)
 
-    sp = spotifyapi.APIReq(code)
+    sp = spotifyclient.SpotifyClient(code)
 
     # Get the information about the user's playback so
     # playback can stop at the end of a track
-    info = sp.get_info_playback()
-
-    retries = RETRY_AMOUNT
-    while 'item' not in info:
-        info = sp.get_info_playback()
-        retries -= 1
-        if retries == 0:
-            return {'info': [], 'Error': 'Max retries reached request failed'}
+    info = await retrypolicy.call("get_info_playback", sp.get_info_playback, check='item')
+    if info is None:
+        return {'info': [], 'Error': 'Max retries reached request failed'}
 
     # Calculate the time left to wait for the end of the track
     time_left = (info['item']['duration_ms']-info['progress_ms'])
@@ -187,15 +241,16 @@ async def sleep_timer(user: str, time: int) -> dict:
     await asyncio.sleep(time_left//1000)
 
     # Pause the playback
-    ret = sp.pause_playback()
+    ret = await retrypolicy.call("pause_playback", sp.pause_playback,
+                                 check=lambda x: x == "Successful")
 
-    if ret != "Successful":
-        return {"info": [], "Error": ret}
+    if ret is None:
+        return {"info": [], "Error": "Failed to pause playback"}
 
     return {'info': 'Paused music', 'Error': 0}
 
 
-def get_recommendations(user: str, songs: int, source: list[str]) -> dict:
+async def get_recommendations(user: str, songs: int, source: list[str]) -> dict:
     """
     :arg user: The user to get recommendations for (Required)
     :arg songs: The number of songs to get (Required)
@@ -204,18 +259,20 @@ def get_recommendations(user: str, songs: int, source: list[str]) -> dict:
     Return recommendations for the user
     """
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    code = await get_code(user)
 
-    # Initiate the APIReq class to interact with the api
-    sp = spotifyapi.APIReq(code)
+    # Initiate the client to interact with the api
+    sp = spotifyclient.SpotifyClient(code)
 
     # Convert seed
     if source[:17] == "spotify:playlist":
         # Get the first 5 tracks from the playlist or 5 random songs
-        track_data = sp.get_tracks_playlist(source[17:], 5)['items']
-        tracks = [item['id'] for item in track_data]
+        track_data = await retrypolicy.call("get_tracks_playlist", sp.get_tracks_playlist,
+                                            source[17:], 5, check='items')
+        if track_data is None:
+            return {"info": [], "Error": "Max retries reached, request failed"}
+        track_data = map(trackinfo.Track.from_item, track_data['items'])
+        tracks = [track.id for track in track_data if track is not None]
         artists = []
     else:
         tracks = []
@@ -227,21 +284,19 @@ def get_recommendations(user: str, songs: int, source: list[str]) -> dict:
             if item[:15] == "spotify:artist:":
                 artists.append(item[15:])
 
-    # Sort through parameters to specify the correct seed to the command
-    if len(artists) != 0 and len(tracks) != 0:
-        recs = sp.get_recommendations(songs, artists=artists, tracks=tracks)
-    elif len(artists) != 0:
-        recs = sp.get_recommendations(songs, artists=artists)
-    elif len(tracks) != 0:
-        recs = sp.get_recommendations(songs, tracks=tracks)
-    else:
+    # Make sure there is a seed to give to the command
+    if len(artists) == 0 and len(tracks) == 0:
         return {"info": [], "Error": "Error no seed source"}
 
-    # TODO add error handling to the returned recommendations
+    recs = await retrypolicy.call("get_recommendations", sp.get_recommendations,
+                                  songs, artists, tracks, check='tracks')
+    if recs is None:
+        return {"info": [], "Error": "Max retries reached, request failed"}
+
     return {"info": recs, "Error": 0}
 
 
-def add_to_queue(user: str, tracks: list[str]) -> dict:
+async def add_to_queue(user: str, tracks: list[str]) -> dict:
     """
     :arg user: The user to add the tracks to (Required)
     :arg tracks: A list of track instances from spotify api (Required)
@@ -249,31 +304,43 @@ def add_to_queue(user: str, tracks: list[str]) -> dict:
     Adds given tracks to the user's queue
     """
     scope = "user-modify-playback-state"
-    if computations.check_user(user, scope):
+    if await computations.check_user_async(user, scope):
         return {"info": [], "Error": "Error, user not authenticated for request, run `+setup all`"}
 
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, scope=scope, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
-
-    # Initiate the APIReq class to interact with the api
-    sp = spotifyapi.APIReq(code)
-
-    info = []
-    for track in tracks:
-        response = sp.add_track_playback(computations.id_to_uri("track", track))
-        retries = RETRY_AMOUNT
-        while response != "Successful":
-            response = sp.add_track_playback(computations.id_to_uri("track", track))
-            retries -= 1
-            if retries == 0:
-                info.append(f"Failed on track {track}")
+    code = await get_code(user, scope)
+
+    # Initiate the client to interact with the api
+    sp = spotifyclient.SpotifyClient(code)
+
+    # Keep the last response to see why a track failed
+    last = {}
+
+    async def add_track(uri):
+        last['response'] = await sp.add_track_playback(uri)
+        return last['response']
+
+    failed = 0
+    for i, track in enumerate(tracks):
+        response = await retrypolicy.call("add_track_playback", add_track,
+                                          computations.id_to_uri("track", track),
+                                          check=lambda x: x == "Successful")
+        if response is None:
+            # The rest of the tracks would fail the same way,
+            # such as when there is no active device
+            if retrypolicy.fatal(last.get('response')):
+                error = last['response']['error']
+                return {"info": [], "Error": f"Failed on {len(tracks) - i + failed}"
+                                             f" tracks: {error.get('message')}"}
+            failed += 1
+
+    if failed:
+        return {"info": "Request successful", "Error": f"Failed on {failed} tracks"}
 
     return {"info": "Request successful", "Error": 0}
 
 
-def create_playlist(user: str, tracks: list, name: str) -> dict:
+async def create_playlist(user: str, tracks: list, name: str) -> dict:
     """
     :arg user: The name of the user to add the playlist to (Required)
     :arg tracks: A list of track instances from spotify api (Required)
@@ -282,50 +349,42 @@ def create_playlist(user: str, tracks: list, name: str) -> dict:
     Adds given tracks to a playlist for the user
     """
     scope = "playlist-modify-public"
-    if computations.check_user(user, scope):
+    if await computations.check_user_async(user, scope):
         return {"info": [], "Error": "Error, user not authenticated"
                                      "for request, use command `+setup all`"}
 
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, scope=scope, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    code = await get_code(user, scope)
 
-    # Initiate the APIReq class to interact with the api
-    sp = spotifyapi.APIReq(code)
+    # Initiate the client to interact with the api
+    sp = spotifyclient.SpotifyClient(code)
 
     # Get user id
-    response = sp.get_user()
-
-    retries = RETRY_AMOUNT
-    while 'id' not in response:
-        response = sp.get_user()
-        retries -= 1
-        if retries == 0:
-            return {'info': [], 'Error': 'Max retries reached, request failed'}
+    response = await retrypolicy.call("get_user", sp.get_user, check='id')
+    if response is None:
+        return {'info': [], 'Error': 'Max retries reached, request failed'}
     user_id = response['id']
 
     # Create playlist
-    playlist = sp.create_playlist(user_id, name)
-
-    retries = RETRY_AMOUNT
-    while 'id' not in playlist:
-        playlist = sp.create_playlist(user_id, name)
-        retries -= 1
-        if retries == 0:
-            return {'info': [], 'Error': 'Max retries reached, request failed'}
+    playlist = await retrypolicy.call("create_playlist", sp.create_playlist,
+                                      user_id, name, check='id')
+    if playlist is None:
+        return {'info': [], 'Error': 'Max retries reached, request failed'}
     playlist_id = playlist['id']
 
     track_uris = [track['uri'] for track in tracks]
 
     for i in range(math.ceil(len(track_uris)/100)):
-        # TODO check that each request is made successfully
-        sp.add_items_playlist(playlist_id, track_uris[i*100:(i+1)*100])
+        response = await retrypolicy.call("add_items_playlist", sp.add_items_playlist,
+                                          playlist_id, track_uris[i*100:(i+1)*100],
+                                          check='snapshot_id')
+        if response is None:
+            return {'info': [], 'Error': 'Max retries reached, request failed'}
 
     return {"info": "Request successful", "Error": 0}
 
 
-def top_ten(user: str, time_range: str) -> dict:
+async def top_ten(user: str, time_range: str) -> dict:
     """
     :arg user: The user to get the songs of (Required)
     :arg time_range: The range to get the songs for (Required)
@@ -334,25 +393,19 @@ def top_ten(user: str, time_range: str) -> dict:
     """
 
     scope = "user-top-read"
-    if computations.check_user(user, scope):
+    if await computations.check_user_async(user, scope):
         return {"info": [], "Error": "Error, user not authenticated for request, use command `+setup all`"}
 
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, scope=scope, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    code = await get_code(user, scope)
 
-    # Initiate the APIReq class to interact with the api
-    sp = spotifyapi.APIReq(code)
+    # Initiate the client to interact with the api
+    sp = spotifyclient.SpotifyClient(code)
 
-    response = sp.top_tracks(f"{time_range}_term", 10)
-
-    retries = RETRY_AMOUNT
-    while 'items' not in response:
-        response = sp.top_tracks(f"{time_range}_term", 10)
-        retries -= 1
-        if retries == 0:
-            return {'info': [], 'Error': 'Max retries used, request failed'}
+    response = await retrypolicy.call("top_tracks", sp.top_tracks,
+                                      f"{time_range}_term", 10, check='items')
+    if response is None:
+        return {'info': [], 'Error': 'Max retries used, request failed'}
     tracks = response['items']
 
     return {"info": tracks, "Error": 0}
@@ -366,23 +419,16 @@ async def genres(user: str, artists: list[str]) -> dict:
     Gets the genres of a given list of artist
     """
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    code = await get_code(user)
 
-    # Initiate the APIReq class to interact with the api
-    sp = spotifyapi.APIReq(code)
+    # Initiate the client to interact with the api
+    sp = spotifyclient.SpotifyClient(code)
 
     genre_list = []
 
-    artist_list = sp.get_artists(artists)
-
-    retries = RETRY_AMOUNT
-    while 'artists' not in artist_list:
-        artist_list = sp.get_artists(artists)
-        retries -= 1
-        if retries == 0:
-            return {'info': [], 'Error': 'Max retries reached'}
+    artist_list = await retrypolicy.call("get_artists", sp.get_artists, artists, check='artists')
+    if artist_list is None:
+        return {'info': [], 'Error': 'Max retries reached'}
 
     artists = artist_list['artists']
     for artist in artists:
@@ -391,68 +437,62 @@ async def genres(user: str, artists: list[str]) -> dict:
     return {'info': list(set(genre_list)), 'Error': 0}
 
 
-async def get_playlist_songs(user: str, playlist_id: str, private: bool, sp: spotifyapi.APIReq = None) -> dict:
+async def iter_playlist_songs(user: str, playlist_id: str, private: bool, sp: spotifyclient.SpotifyClient = None,
+                              fields: str = trackinfo.FIELDS):
     """
     :arg user: The user to authenticate (Required)
     :arg playlist_id: The id of the playlist to get songs for (Required)
     :arg private: Whether the playlist is private or not (Required)
-    :arg sp: An instance of the spotify api APIReq class for use (Optional)
-    :return dict: The dict of songs in the playlist
-    Gets all the songs in a playlist
+    :arg sp: An instance of the spotify api client for use (Optional)
+    :arg fields: The fields to request for each track (Optional)
+    :return: Yields dicts holding a page of trackinfo.Track and its offset
+    Gets the songs in a playlist a page at a time, yielding each
+    page as soon as it arrives, which may be out of order
     """
     if sp is None:
         scope = ""
         if private:
             scope = "playlist-read-private"
 
-        if computations.check_user(user, scope):
-            return {"info": [],
-                    "Error": "'''```User has wrong scope\n"
-                             "re-authenticate using the `+setup all` command please```"}
+        if await computations.check_user_async(user, scope):
+            yield {"info": [], "offset": 0,
+                   "Error": "'''```User has wrong scope\n"
+                            "re-authenticate using the `+setup all` command please```"}
+            return
 
         # Get the auth code
-        if scope != "":
-            code = spotifyapi.init(redirect_uri, user, scope=scope, save_func=computations.save_user,
-                                   read_func=computations.get_user, update_func=computations.update_user,
-                                   check_func=computations.check_user_exist)
-        else:
-            code = spotifyapi.init(redirect_uri, user, save_func=computations.save_user,
-                                   read_func=computations.get_user, update_func=computations.update_user,
-                                   check_func=computations.check_user_exist)
-
-        # Initiate the APIReq class to interact with the api
-        sp = spotifyapi.APIReq(code)
-
-    # Get the total number of songs on the playlist
-    response = sp.get_tracks_playlist(playlist_id, 1)
-
-    retries = RETRY_AMOUNT
-    while 'total' not in response:
-        response = sp.get_tracks_playlist(playlist_id, 1)
-        retries -= 1
-        if retries == 0:
-            return {'info': [], 'Error': 'Max retries reached, request failed'}
-    total = response['total']
+        code = await get_code(user, scope)
 
-    # Create a list of requests to be made
-    requests = [[100, i*100] for i in range(math.ceil(total/100))]
+        # Initiate the client to interact with the api
+        sp = spotifyclient.SpotifyClient(code)
 
-    # Create list of requests in chunks of 50
-    request_chunks = [requests[i*50: (i+1)*50] for i in range(math.ceil(len(requests)/50))]
-
-    tracks = []
-
-    loop = asyncio.get_event_loop()
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        for request_set in request_chunks:
-            songs, wait_time = await get_tracks(request_set, loop, executor, sp, playlist_id)
-            while wait_time is not None:
-                await asyncio.sleep(int(wait_time))
-                songs, wait_time = await get_tracks(request_set, loop, executor, sp, playlist_id)
-
-            tracks += songs
-
-    return {'info': tracks, 'Error': 0}
+    # Get the first page, which also holds the total number of songs
+    response = await retrypolicy.call("get_tracks_playlist", sp.get_tracks_playlist,
+                                      playlist_id, 100, 0, fields, check='total')
+    if response is None:
+        yield {'info': [], 'offset': 0, 'Error': 'Max retries reached, request failed'}
+        return
+    total = response['total']
+    yield {'info': get_page(response), 'offset': 0, 'Error': 0}
+
+    # Create a list of the offsets of the other pages
+    offsets = [i*100 for i in range(1, math.ceil(total/100))]
+
+    # Request at most 50 pages at a time so memory stays bounded
+    for i in range(0, len(offsets), 50):
+        requests = [asyncio.ensure_future(get_page_at(sp, playlist_id, offset, fields))
+                    for offset in offsets[i:i+50]]
+        try:
+            for request in asyncio.as_completed(requests):
+                offset, page = await request
+                if page is None:
+                    yield {'info': [], 'offset': offset, 'Error': 'Max retries reached, request failed'}
+                    return
+                yield {'info': page, 'offset': offset, 'Error': 0}
+        finally:
+            # Stop any requests left if the consumer stopped early
+            for request in requests:
+                request.cancel()
 
 
 async def get_artists(user: str, playlist: str) -> dict:
@@ -460,58 +500,50 @@ async def get_artists(user: str, playlist: str) -> dict:
     :arg user: The user id (Required)
     :arg playlist: The id of the playlist to look at (Required)
     :return dict: Info about the artists
-    Gets the artists in a playlist
+    Gets the artists in a playlist, along with other statistics
+    about the playlist
     """
     # If the user isn't in the database send an error
-    if not computations.check_user_exist(user):
+    if not await computations.check_user_exist_async(user):
         return {"info": [],
                 "Error": "'''```User doesn't exist\n"
                          "authenticate using the `+setup all` command please```"}
 
     playlist_id = computations.uri_to_id(playlist)
 
-    tracks = await get_playlist_songs(user, playlist_id, False)
+    # Add each page of tracks to the statistics as it arrives
+    stats = analytics.PlaylistStats()
+    async for page in iter_playlist_songs(user, playlist_id, False, fields=trackinfo.STATS_FIELDS):
+        if page['Error'] != 0:
+            return {"info": [], "Error": page['Error']}
 
-    # Get all the artists for the tracks
-    artists = []
-    for track in tracks['info']:
-        artists += [artist['name'] for artist in track['track']['artists']]
+        stats.add_page(page['info'])
 
-    # Convert the list to a dictionary with counts of each artist
-    artists = collections.Counter(artists)
+    return {"info": stats.summary(10), "Error": 0}
 
-    # Work out the percentage for each artist
-    percentages = [format(artists[key]/sum(map(int, artists.values()))*100, '.3') for key in artists.keys()]
 
-    return {"info": {"artists": sorted(list(zip(artists.keys(), percentages)), key=lambda x: 100-float(x[1]))[:10],
-            "Total": sum(map(int, artists.values()))},
-            "Error": 0}
-
-
-def cur_song(user: str) -> dict:
+async def cur_song(user: str) -> dict:
     """
     :arg user: The id of the user to get the current song of (Required)
     :return dict: Info about the current song
     Gets the current song the user is playing
     """
     # If the user isn't in the database send an error
-    if not computations.check_user_exist(user):
+    if not await computations.check_user_exist_async(user):
         return {"info": [],
                 "Error": "```User doesn't exist"
                          "authenticate using the `+setup all` command please```"}
 
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    code = await get_code(user)
 
-    # Create an APIReq instance
-    sp = spotifyapi.APIReq(code)
+    # Create a client instance
+    sp = spotifyclient.SpotifyClient(code)
 
     # Get the information about the user's playback
-    info = sp.get_info_playback()
+    info = await retrypolicy.call("get_info_playback", sp.get_info_playback, check='item')
 
-    if 'item' not in info:
+    if info is None:
         return {"info": [], "Error": "```The request failed, make sure that you have an active"
                                      " device and are a premium user```"}
 
@@ -522,75 +554,117 @@ def cur_song(user: str) -> dict:
     return {"info": search, "Error": 0}
 
 
-async def get_tracks(request_set: list, loop: asyncio.AbstractEventLoop,
-                     executor,
-                     sp: spotifyapi.APIReq, playlist_id: str) -> list[list, int]:
+async def queued_songs(user: str, amount: int) -> dict:
+    """
+    :arg user: The id of the user to get the queue of (Required)
+    :arg amount: The most songs to get (Required)
+    :return dict: The name and artist of the songs queued next
+    Gets the songs queued after the user's current song
+    """
+    # If the user isn't in the database send an error
+    if not await computations.check_user_exist_async(user):
+        return {"info": [],
+                "Error": "```User doesn't exist"
+                         "authenticate using the `+setup all` command please```"}
+
+    # Get the auth code
+    code = await get_code(user)
+
+    # Queued songs aren't waited on by the user
+    sp = spotifyclient.SpotifyClient(code, spotifyclient.BATCH)
+
+    info = await retrypolicy.call("get_queue", sp.get_queue, check='queue')
+
+    if info is None:
+        return {"info": [], "Error": "```The request failed, make sure that you have an active"
+                                     " device```"}
+
+    # Podcast episodes in the queue have no artists
+    songs = [[item['name'], item['artists'][0]['name']]
+             for item in info['queue'] if item.get('artists')]
+
+    return {"info": songs[:amount], "Error": 0}
+
+
+def get_page(response: dict) -> list:
+    """
+    :arg response: A page of playlist items from the api (Required)
+    :return list: The trackinfo.Track on the page
+    Converts each item to a track, dropping the rest of the json
+    """
+    page = []
+    for item in response['items']:
+        track = trackinfo.Track.from_item(item)
+        if track is not None:
+            page.append(track)
+
+    return page
+
+
+async def get_page_at(sp: spotifyclient.SpotifyClient, playlist_id: str, offset: int,
+                      fields: str = trackinfo.FIELDS) -> list:
     """
-    :arg request_set: The set of requests (Required)
-    :arg loop: The asyncio loop (Required)
-    :arg executor: The executor from concurrent.futures to run the requests in (Required)
     :arg sp: Instance of the spotify api class to make requests to (Required)
     :arg playlist_id: The id of the playlist to get (Required)
-    :return list: A list of the songs returned by the requests
-    Makes requests with asyncio, with pauses when a timeout error
-    occurs so that all songs are fetched
-    """
-    fetched_tracks = []
-    futures = []
-    wait_time = None
-    for request in request_set:
-        futures.append(loop.run_in_executor(executor,
-                                            sp.get_tracks_playlist, playlist_id,
-                                            *request))
-
-    for future in futures:
-        songs = await future
-        # TODO add other error handling for case where not expected
-        # TODO but not with a time_out
-        if 'time_out' in songs:
-            # Failed request
-            wait_time = songs['time_out']
-        elif 'items' in songs:
-            fetched_tracks += songs['items']
-        else:
-            # An error has occurred
-            # try again?
-            ...
-
-    return [fetched_tracks, wait_time]
-
-
-def top_playlist(user: str) -> dict:
+    :arg offset: The index of the first track of the page (Required)
+    :arg fields: The fields to request for each track (Optional)
+    :return list: The offset and the trackinfo.Track on the page,
+    which are None if the request failed
+    Gets a page of 100 tracks from a playlist
+    """
+    response = await retrypolicy.call("get_tracks_playlist", sp.get_tracks_playlist,
+                                      playlist_id, 100, offset, fields, check='items')
+    if response is None:
+        return [offset, None]
+
+    return [offset, get_page(response)]
+
+
+async def top_playlist(user: str) -> dict:
     """
     :arg user: The user to create the playlist for
     :return dict: Whether the request was successful or not
     Creates (or updates) a playlist containing the top 99 songs for a user
     """
     scope = "user-top-read playlist-modify-public"
-    if computations.check_user(user, scope):
+    if await computations.check_user_async(user, scope):
         return {"info": [], "Error": "Error, user not authenticated for request, use command `+setup all`"}
 
     # Get the auth code
-    code = spotifyapi.init(redirect_uri, user, scope=scope, save_func=computations.save_user,
-                           read_func=computations.get_user, update_func=computations.update_user,
-                           check_func=computations.check_user_exist)
+    code = await get_code(user, scope)
 
-    # Create an APIReq instance
-    sp = spotifyapi.APIReq(code)
+    # Create a client instance, giving way to interactive commands
+    sp = spotifyclient.SpotifyClient(code, spotifyclient.BATCH)
 
     # Get all tracks
-    tracks = [track['uri'] for track in sp.top_tracks("short_term", 50)['items']]
-    tracks += [track['uri'] for track in sp.top_tracks("short_term", 50, 49)['items']][1:]
+    first = await retrypolicy.call("top_tracks", sp.top_tracks, "short_term", 50, check='items')
+    second = await retrypolicy.call("top_tracks", sp.top_tracks, "short_term", 50, 49, check='items')
+    if first is None or second is None:
+        return {"info": [], "Error": "Max retries reached, request failed"}
+    tracks = [track['uri'] for track in first['items']]
+    tracks += [track['uri'] for track in second['items']][1:]
+
+    playlists = await retrypolicy.call("get_users_playlists", sp.get_users_playlists, check='items')
+    if playlists is None:
+        return {"info": [], "Error": "Max retries reached, request failed"}
 
     play_id = None
-    for playlist in sp.get_users_playlists()['items']:
+    for playlist in playlists['items']:
         if playlist['name'] == "top99":
             play_id = playlist['id']
 
     if play_id is None:
-        user_id = sp.get_user()['id']
-        play_id = sp.create_playlist(user_id, "top99")['id']
-
-    info = sp.replace_items(play_id, tracks)
+        user_info = await retrypolicy.call("get_user", sp.get_user, check='id')
+        if user_info is None:
+            return {"info": [], "Error": "Max retries reached, request failed"}
+        playlist = await retrypolicy.call("create_playlist", sp.create_playlist,
+                                          user_info['id'], "top99", check='id')
+        if playlist is None:
+            return {"info": [], "Error": "Max retries reached, request failed"}
+        play_id = playlist['id']
+
+    info = await retrypolicy.call("replace_items", sp.replace_items, play_id, tracks, check='snapshot_id')
+    if info is None:
+        return {"info": [], "Error": "Max retries reached, request failed"}
 
     return {"info": info, "Error": 0}
@@ -0,0 +1,387 @@
+# Import standard libraries
+import os
+import json
+import time
+import asyncio
+
+# Import 3rd party libraries
+import aiohttp
+
+# Use the faster json library when it is installed
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Base url of the spotify api
+base = "https://api.spotify.com/v1"
+
+# Maximum number of connections open to spotify across the bot
+MAX_CONNECTIONS = int(os.getenv('SPOTIFY_CONCURRENCY', '10'))
+
+# Seconds to wait for a request before giving up
+REQUEST_TIMEOUT = float(os.getenv('SPOTIFY_TIMEOUT', '30'))
+
+# Requests per second allowed and the size of a burst
+RATE = float(os.getenv('SPOTIFY_RATE', '10'))
+BURST = int(os.getenv('SPOTIFY_BURST', '20'))
+
+# Number of times a request is resent after being rate limited
+RATE_LIMIT_RETRIES = 3
+
+# Priorities of requests, interactive requests go first
+INTERACTIVE = 0
+BATCH = 1
+
+# Session shared by every client so connections are kept alive
+_session = None
+
+
+class RateGovernor:
+    """
+    Token bucket that every spotify request passes through,
+    pausing all requests when spotify rate limits the bot
+    """
+    def __init__(self, rate: float, burst: int):
+        """
+        :arg rate: The number of requests allowed per second (Required)
+        :arg burst: The number of requests allowed at once (Required)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+        # Number of requests waiting at each priority
+        self.waiting = {INTERACTIVE: 0, BATCH: 0}
+
+        # Counters of how the governor has been used
+        self.metrics = {"requests": 0, "rate_limited": 0, "wait_time": 0.0}
+
+    def _refill(self, now: float) -> None:
+        """
+        :arg now: The current time (Required)
+        :return None:
+        Adds the tokens gained since the last refill
+        """
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait_time(self, priority: int) -> float:
+        """
+        :arg priority: The priority of the request (Required)
+        :return float: Seconds to wait before trying again, 0 if a
+        token was taken
+        Tries to take a token for a request
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        self._refill(now)
+
+        # Batch requests give way to waiting interactive requests
+        if priority == BATCH and self.waiting[INTERACTIVE] > 0:
+            return 1 / self.rate
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        """
+        :arg priority: The priority of the request (Optional)
+        :return None:
+        Waits until a request can be made
+        """
+        start = time.monotonic()
+        self.waiting[priority] += 1
+        try:
+            wait = self._wait_time(priority)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._wait_time(priority)
+        finally:
+            self.waiting[priority] -= 1
+
+        self.metrics["requests"] += 1
+        self.metrics["wait_time"] += time.monotonic() - start
+
+    def pause(self, retry_after: float) -> None:
+        """
+        :arg retry_after: Seconds spotify asked to wait (Required)
+        :return None:
+        Stops every request until the wait has passed
+        """
+        self.metrics["rate_limited"] += 1
+        self.paused_until = max(self.paused_until,
+                                time.monotonic() + retry_after)
+        self.tokens = 0
+
+    def stats(self) -> dict:
+        """
+        :return dict: Information about the governor
+        Gets the remaining budget and the number of waiting requests
+        """
+        now = time.monotonic()
+        self._refill(now)
+        stats = dict(self.metrics)
+        stats["budget"] = int(self.tokens)
+        stats["paused_for"] = max(0.0, self.paused_until - now)
+        stats["queued_interactive"] = self.waiting[INTERACTIVE]
+        stats["queued_batch"] = self.waiting[BATCH]
+        return stats
+
+
+# Governor shared by every client
+governor = RateGovernor(RATE, BURST)
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    :return ClientSession: The shared http session
+    Creates the shared session on first use and returns it
+    """
+    global _session
+
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS,
+                                         keepalive_timeout=60,
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        _session = aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout)
+    return _session
+
+
+async def close() -> None:
+    """
+    :return None:
+    Closes the shared session
+    """
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def error_response(status: int, data: dict) -> dict:
+    """
+    :arg status: The status code of the response (Required)
+    :arg data: The decoded response (Required)
+    :return dict: The response in spotify's error format
+    Makes sure a failed response has an error with its status,
+    so that retrypolicy can tell whether to retry it
+    """
+    # Rate limited responses keep the time to wait
+    error = data.get("error")
+    if "time_out" in data or (isinstance(error, dict) and "status" in error):
+        return data
+    return {"error": {"status": status, "message": str(error or data)}}
+
+
+class SpotifyClient:
+    """
+    Makes requests to the spotify api for a user,
+    mirroring the methods of spotifyapi.APIReq
+    """
+    def __init__(self, token: str, priority: int = INTERACTIVE):
+        """
+        :arg token: The auth token of the user (Required)
+        :arg priority: INTERACTIVE or BATCH, for the rate governor (Optional)
+        """
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.priority = priority
+
+    async def request(self, method: str, path: str, params: dict = None,
+                      body: dict = None) -> list[int, dict]:
+        """
+        :arg method: The http method to use (Required)
+        :arg path: The path of the endpoint (Required)
+        :arg params: The query parameters (Optional)
+        :arg body: The json body to send (Optional)
+        :return list: The status code and the decoded response
+        Makes a request to the api through the rate governor, returning
+        a dict with the time_out key if it stays rate limited
+        """
+        session = await get_session()
+
+        retries = RATE_LIMIT_RETRIES
+        while True:
+            await governor.acquire(self.priority)
+            async with session.request(method, f"{base}{path}",
+                                       headers=self.headers, params=params,
+                                       json=body) as response:
+                content = await response.read()
+                status = response.status
+                retry_after = response.headers.get("Retry-After", "1")
+
+            if status != 429:
+                break
+
+            # Pause every request for the time spotify asked
+            governor.pause(int(retry_after))
+            if retries == 0:
+                return [status, {"time_out": int(retry_after)}]
+            retries -= 1
+
+        if len(content) == 0:
+            return [status, {}]
+
+        try:
+            return [status, loads(content)]
+        except ValueError:
+            return [status, {"error": content.decode(errors="replace")}]
+
+    async def get(self, path: str, **params) -> dict:
+        """
+        :arg path: The path of the endpoint (Required)
+        :arg params: The query parameters (Optional)
+        :return dict: The decoded response
+        Makes a get request to the api
+        """
+        _, data = await self.request("GET", path, params=params)
+        return data
+
+    async def get_users_playlists(self, limit: int = 20,
+                                  offset: int = 0) -> dict:
+        """
+        :arg limit: The number of playlists to get (Optional)
+        :arg offset: The index of the first playlist (Optional)
+        :return dict: A page of the user's playlists
+        Gets the playlists of the user
+        """
+        return await self.get("/me/playlists", limit=limit, offset=offset)
+
+    async def get_tracks_playlist(self, playlist_id: str, limit: int = 100,
+                                  offset: int = 0, fields: str = None) -> dict:
+        """
+        :arg playlist_id: The id of the playlist (Required)
+        :arg limit: The number of tracks to get (Optional)
+        :arg offset: The index of the first track (Optional)
+        :arg fields: The fields to return, in spotify's format (Optional)
+        :return dict: A page of the playlist's tracks
+        Gets the tracks of a playlist
+        """
+        params = {"limit": limit, "offset": offset}
+        if fields is not None:
+            params["fields"] = fields
+        return await self.get(f"/playlists/{playlist_id}/tracks", **params)
+
+    async def get_info_playback(self) -> dict:
+        """
+        :return dict: Information about the user's playback
+        Gets the current playback of the user
+        """
+        return await self.get("/me/player")
+
+    async def get_queue(self) -> dict:
+        """
+        :return dict: The song playing and the songs queued after it
+        Gets the playback queue of the user
+        """
+        return await self.get("/me/player/queue")
+
+    async def pause_playback(self):
+        """
+        :return: "Successful", or the error response if it failed
+        Pauses the user's playback
+        """
+        status, data = await self.request("PUT", "/me/player/pause")
+        if status < 300:
+            return "Successful"
+        return error_response(status, data)
+
+    async def add_track_playback(self, uri: str):
+        """
+        :arg uri: The uri of the track to queue (Required)
+        :return: "Successful", or the error response if it failed
+        Adds a track to the user's queue
+        """
+        status, data = await self.request("POST", "/me/player/queue",
+                                          params={"uri": uri})
+        if status < 300:
+            return "Successful"
+        return error_response(status, data)
+
+    async def get_user(self) -> dict:
+        """
+        :return dict: The user's profile
+        Gets the profile of the user
+        """
+        return await self.get("/me")
+
+    async def create_playlist(self, user_id: str, name: str) -> dict:
+        """
+        :arg user_id: The spotify id of the user (Required)
+        :arg name: The name of the playlist (Required)
+        :return dict: The created playlist
+        Creates a playlist for the user
+        """
+        _, data = await self.request("POST", f"/users/{user_id}/playlists",
+                                     body={"name": name})
+        return data
+
+    async def add_items_playlist(self, playlist_id: str,
+                                 uris: list[str]) -> dict:
+        """
+        :arg playlist_id: The id of the playlist (Required)
+        :arg uris: The uris of the tracks to add, max 100 (Required)
+        :return dict: The snapshot of the playlist
+        Adds tracks to a playlist
+        """
+        _, data = await self.request("POST", f"/playlists/{playlist_id}/tracks",
+                                     body={"uris": uris})
+        return data
+
+    async def replace_items(self, playlist_id: str, uris: list[str]) -> dict:
+        """
+        :arg playlist_id: The id of the playlist (Required)
+        :arg uris: The uris of the tracks, max 100 (Required)
+        :return dict: The snapshot of the playlist
+        Replaces the tracks of a playlist
+        """
+        _, data = await self.request("PUT", f"/playlists/{playlist_id}/tracks",
+                                     body={"uris": uris})
+        return data
+
+    async def top_tracks(self, time_range: str, limit: int = 20,
+                         offset: int = 0) -> dict:
+        """
+        :arg time_range: The range to get the tracks for (Required)
+        :arg limit: The number of tracks to get (Optional)
+        :arg offset: The index of the first track (Optional)
+        :return dict: The user's top tracks
+        Gets the top tracks of the user
+        """
+        return await self.get("/me/top/tracks", time_range=time_range,
+                              limit=limit, offset=offset)
+
+    async def get_artists(self, artists: list[str]) -> dict:
+        """
+        :arg artists: The ids of the artists, max 50 (Required)
+        :return dict: The artists
+        Gets information about several artists
+        """
+        return await self.get("/artists", ids=",".join(artists))
+
+    async def get_recommendations(self, limit: int, artists: list[str] = None,
+                                  tracks: list[str] = None) -> dict:
+        """
+        :arg limit: The number of tracks to get (Required)
+        :arg artists: The artist ids to seed with (Optional)
+        :arg tracks: The track ids to seed with (Optional)
+        :return dict: The recommended tracks
+        Gets recommendations based upon the seeds
+        """
+        params = {"limit": limit}
+        if artists:
+            params["seed_artists"] = ",".join(artists)
+        if tracks:
+            params["seed_tracks"] = ",".join(tracks)
+        return await self.get("/recommendations", **params)
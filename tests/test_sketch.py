@@ -0,0 +1,77 @@
+# Import standard libraries
+import os
+import sys
+import random
+
+# Let the tests import the bot's modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import 3rd party libraries
+import pytest
+
+# Import custom script
+import sketch
+
+# Number of random library pairs tried for each overlap ratio
+TRIALS = 25
+
+
+def make_pair(rng: random.Random, sizes: tuple, share: float) -> tuple:
+    """
+    :arg rng: The random generator to use (Required)
+    :arg sizes: The size of the two libraries (Required)
+    :arg share: The share of the smaller library in both (Required)
+    :return tuple: The two libraries and the number of shared songs
+    Creates two libraries of random ids with a known overlap
+    """
+    shared = int(min(sizes) * share)
+    common = [f"c{rng.getrandbits(64):016x}" for _ in range(shared)]
+    first = common + [f"a{rng.getrandbits(64):016x}"
+                      for _ in range(sizes[0] - shared)]
+    second = common + [f"b{rng.getrandbits(64):016x}"
+                       for _ in range(sizes[1] - shared)]
+    return first, second, shared
+
+
+def estimate_pair(first: list, second: list) -> list:
+    """
+    :arg first: The first library (Required)
+    :arg second: The second library (Required)
+    :return list: The estimated shared songs, total songs and margin
+    Estimates the overlap of two libraries from their sketches
+    """
+    signatures = [sketch.from_bytes(sketch.to_bytes(sketch.signature(songs)))
+                  for songs in (first, second)]
+    return sketch.estimate(signatures, [len(first), len(second)])
+
+
+def test_small_libraries_are_exact():
+    rng = random.Random(1)
+    first, second, shared = make_pair(rng, (3000, 5000), 0.1)
+
+    estimate, union, margin = estimate_pair(first, second)
+
+    assert estimate == shared
+    assert union == len(first) + len(second) - shared
+    assert margin == 0
+
+
+@pytest.mark.parametrize("share", [0.02, 0.1, 0.3, 0.7])
+def test_estimate_error(share):
+    rng = random.Random(int(share * 100))
+
+    errors = []
+    covered = 0
+    for _ in range(TRIALS):
+        sizes = (rng.randint(2000, 20000), rng.randint(2000, 20000))
+        first, second, shared = make_pair(rng, sizes, share)
+
+        estimate, _, margin = estimate_pair(first, second)
+        errors.append(abs(estimate - shared) / shared)
+        covered += abs(estimate - shared) <= margin
+
+    # The typical error stays small even when few songs are shared,
+    # and the margin shown to users holds most of the time
+    assert sum(errors) / len(errors) < 0.10
+    assert max(errors) < 0.5
+    assert covered / TRIALS >= 0.85
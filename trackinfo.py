@@ -0,0 +1,72 @@
+# Fields of a playlist page needed to build tracks
+FIELDS = "total,items(track(id,name,is_local,artists(id,name)))"
+
+# Fields needed to build tracks with album and popularity details
+STATS_FIELDS = "total,items(track(id,name,is_local,popularity," \
+               "album(name,release_date),artists(id,name)))"
+
+
+class Track:
+    """
+    The details of a track the bot uses,
+    kept small as libraries hold many of them
+    """
+    __slots__ = ("id", "name", "artist_ids", "artist_names", "is_local",
+                 "album", "year", "popularity")
+
+    def __init__(self, id_: str, name: str, artist_ids: tuple,
+                 artist_names: tuple, is_local: bool, album: str = None,
+                 year: int = None, popularity: int = None):
+        """
+        :arg id_: The id of the track (Required)
+        :arg name: The name of the track (Required)
+        :arg artist_ids: The ids of the artists on the track (Required)
+        :arg artist_names: The names of the artists on the track (Required)
+        :arg is_local: Whether the track is a local file (Required)
+        :arg album: The name of the album, if requested (Optional)
+        :arg year: The release year of the album, if requested (Optional)
+        :arg popularity: The popularity of the track, if requested (Optional)
+        """
+        self.id = id_
+        self.name = name
+        self.artist_ids = artist_ids
+        self.artist_names = artist_names
+        self.is_local = is_local
+        self.album = album
+        self.year = year
+        self.popularity = popularity
+
+    @property
+    def artist(self) -> str:
+        """
+        :return str: The name of the first artist
+        Gets the main artist of the track
+        """
+        return self.artist_names[0] if self.artist_names else ""
+
+    @classmethod
+    def from_item(cls, item: dict):
+        """
+        :arg item: A playlist item from the spotify api (Required)
+        :return Track: The track, or None if the item has no track
+        Creates a track from a playlist item
+        """
+        track = item.get('track')
+        if track is None:
+            return None
+
+        artists = track.get('artists') or []
+
+        # Only present when the album was requested
+        album = track.get('album') or {}
+        release = album.get('release_date')
+        year = int(release[:4]) if release and release[:4].isdigit() else None
+
+        return cls(track['id'], track['name'],
+                   tuple(artist['id'] for artist in artists),
+                   tuple(artist['name'] for artist in artists),
+                   track.get('is_local', False), album.get('name'), year,
+                   track.get('popularity'))
+
+    def __repr__(self) -> str:
+        return f"Track({self.id!r}, {self.name!r}, {self.artist!r})"